@@ -0,0 +1,242 @@
+import glob
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import urllib.request
+from flask import request, abort, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Static asset pipeline. `flask build-assets` purges the Tailwind stylesheet
+# down to the classes the templates and scripts use, copies every file under
+# static/ to a content-hashed name in ASSETS_FOLDER with .gz (and, if the
+# brotli package is installed, .br) variants, and writes a manifest.
+# asset_url('js/main.js') then points at the hashed copy, which is served
+# precompressed with a one-year immutable Cache-Control. Without a build it
+# falls back to the plain static URL (and the Tailwind CDN), so development
+# needs no build step; after a build, rebuild whenever static files change.
+
+TAILWIND_NAME = 'css/tailwind.css'
+MANIFEST_NAME = 'manifest.json'
+ONE_YEAR = 365 * 24 * 3600
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.xml', '.map', '.ico', '.ttf', '.otf'}
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CLASS_TOKEN = re.compile(r'[A-Za-z0-9_:/.\[\]%-]+')
+CSS_CLASS = re.compile(r'\.((?:\\[0-9a-fA-F]{1,6}\s?|\\.|[\w-])+)')
+CSS_ESCAPE = re.compile(r'\\([0-9a-fA-F]{1,6}\s?|.)')
+KEYFRAMES = re.compile(r'@(?:-webkit-)?keyframes\s+([\w-]+)')
+
+def class_tokens(text):
+    # Everything that could be a class name, wherever it appears: class
+    # attributes, Jinja expressions, strings in scripts. Over-matching only
+    # keeps a few extra rules.
+    return set(CLASS_TOKEN.findall(text))
+
+def used_classes(patterns):
+    tokens = set()
+    for pattern in patterns:
+        for path in glob.glob(pattern, recursive=True):
+            with open(path, encoding='utf-8') as f:
+                tokens |= class_tokens(f.read())
+    return tokens
+
+def _unescape(name):
+    # '.md\:flex' -> 'md:flex', '.\32xl\:p-4' -> '2xl:p-4'.
+    def replace(match):
+        value = match.group(1)
+        if value[0] in '0123456789abcdefABCDEF':
+            return chr(int(value.strip(), 16))
+        return value
+    return CSS_ESCAPE.sub(replace, name)
+
+def parse_css(css):
+    # Splits a stylesheet into top-level (prelude, body) pairs; body is None
+    # for statements such as @import or @charset.
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    nodes, i, start, depth, quote = [], 0, 0, 0, None
+    prelude = None
+    while i < len(css):
+        char = css[i]
+        if quote:
+            if char == '\\':
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '{':
+            if depth == 0:
+                prelude, start = css[start:i].strip(), i + 1
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                nodes.append((prelude, css[start:i].strip()))
+                start = i + 1
+        elif char == ';' and depth == 0:
+            nodes.append((css[start:i].strip(), None))
+            start = i + 1
+        i += 1
+    return nodes
+
+def _split_selectors(prelude):
+    # Commas inside :not(...) or attribute selectors do not separate selectors.
+    selectors, depth, current = [], 0, ''
+    for char in prelude:
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        if char == ',' and depth == 0:
+            selectors.append(current.strip())
+            current = ''
+        else:
+            current += char
+    selectors.append(current.strip())
+    return selectors
+
+def _purge_nodes(nodes, used):
+    kept = []
+    for prelude, body in nodes:
+        if body is None:
+            kept.append(f"{prelude};")
+        elif prelude.startswith('@'):
+            if re.match(r'@(media|supports|layer|document)\b', prelude):
+                inner = _purge_nodes(parse_css(body), used)
+                if inner:
+                    kept.append(f"{prelude}{{{''.join(inner)}}}")
+            else:
+                # @font-face, @page, @keyframes (the latter filtered afterwards).
+                kept.append(f"{prelude}{{{body}}}")
+        else:
+            selectors = [selector for selector in _split_selectors(prelude)
+                         if all(_unescape(name) in used for name in CSS_CLASS.findall(selector))]
+            if selectors:
+                kept.append(f"{','.join(selectors)}{{{body}}}")
+    return kept
+
+def purge_css(css, used):
+    # Drops every rule whose selectors all name a class that is not in `used`,
+    # then any @keyframes no remaining rule refers to. /*! license */ comments stay.
+    notices = ''.join(re.findall(r'/\*!.*?\*/', css, flags=re.S))
+    kept = ''.join(_purge_nodes(parse_css(css), used))
+    for name in set(KEYFRAMES.findall(kept)):
+        remaining = re.sub(r'@(?:-webkit-)?keyframes\s+' + re.escape(name) + r'\s*\{(?:[^{}]*\{[^{}]*\})*[^{}]*\}', '', kept)
+        if not re.search(r'animation(?:-name)?\s*:[^;}]*\b' + re.escape(name) + r'\b', remaining):
+            kept = remaining
+    return notices + kept
+
+def _hashed_name(name, content):
+    root, ext = os.path.splitext(name)
+    return f"{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+def build(sources, output_folder, min_compress_size=256):
+    # `sources` maps logical names (as passed to asset_url) to file contents.
+    manifest = {}
+    for name, content in sorted(sources.items()):
+        hashed = _hashed_name(name, content)
+        target = os.path.join(output_folder, hashed)
+        _write(target, content)
+        encodings = []
+        if os.path.splitext(name)[1].lower() in COMPRESSIBLE and len(content) >= min_compress_size:
+            variants = {'gzip': gzip.compress(content, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                variants['br'] = brotli.compress(content, quality=11)
+            for encoding, suffix in ENCODINGS:
+                compressed = variants.get(encoding)
+                if compressed is not None and len(compressed) < len(content):
+                    _write(target + suffix, compressed)
+                    encodings.append(encoding)
+        manifest[name] = {'path': hashed, 'size': len(content), 'encodings': encodings}
+    _write(os.path.join(output_folder, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+def fetch(url, cache_folder):
+    # Downloaded once per URL (pin the version in the URL) and cached.
+    path = os.path.join(cache_folder, 'tailwind-' + hashlib.sha256(url.encode()).hexdigest()[:12] + '.css')
+    if not os.path.exists(path):
+        with urllib.request.urlopen(url, timeout=60) as response:
+            _write(path, response.read())
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+def static_sources(static_folder, exclude):
+    sources = {}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) not in exclude]
+        for filename in files:
+            path = os.path.join(root, filename)
+            with open(path, 'rb') as f:
+                sources[os.path.relpath(path, static_folder).replace(os.sep, '/')] = f.read()
+    return sources
+
+class Assets:
+    def __init__(self, app=None):
+        self.app = None
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('ASSETS_FOLDER', os.path.join(app.static_folder, 'dist'))
+        app.config.setdefault('TAILWIND_CSS_URL', 'https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css')
+        app.extensions['assets'] = self
+        self.load()
+        app.add_template_global(self.url, 'asset_url')
+        app.add_url_rule('/assets/<path:filename>', 'asset', self._serve)
+
+    @property
+    def folder(self):
+        return self.app.config['ASSETS_FOLDER']
+
+    def load(self):
+        try:
+            with open(os.path.join(self.folder, MANIFEST_NAME)) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+
+    def url(self, filename, **values):
+        # Drop-in for url_for('static', filename=...).
+        entry = self.manifest.get(filename)
+        if entry is not None:
+            return url_for('asset', filename=entry['path'], **values)
+        if filename == TAILWIND_NAME:
+            return self.app.config['TAILWIND_CSS_URL']
+        return url_for('static', filename=filename, **values)
+
+    def _serve(self, filename):
+        # Files from earlier builds are still served, so pages rendered by
+        # workers that have not restarted yet keep working during a deploy.
+        if filename == MANIFEST_NAME or filename.endswith(('.gz', '.br', '.tmp')):
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        name, encoding = filename, None
+        compressible = os.path.splitext(filename)[1].lower() in COMPRESSIBLE
+        if compressible:
+            for accepted, suffix in ENCODINGS:
+                if request.accept_encodings[accepted] and os.path.isfile(os.path.join(self.folder, filename + suffix)):
+                    name, encoding = filename + suffix, accepted
+                    break
+        response = send_from_directory(self.folder, name, mimetype=mimetype, max_age=ONE_YEAR)
+        if compressible:
+            response.content_encoding = encoding
+            response.vary.add('Accept-Encoding')
+        # The name changes whenever the content does.
+        response.cache_control.immutable = True
+        return response
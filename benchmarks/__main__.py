@@ -0,0 +1,149 @@
+import json
+import os
+import platform
+import shlex
+import sys
+from datetime import datetime
+import click
+
+# Usage, from the repository root, against a dedicated database:
+#
+#   python -m benchmarks seed --database-url sqlite:////tmp/bench.db --submissions 1000000 --comments 10000000
+#   python -m benchmarks run --database-url sqlite:////tmp/bench.db --thresholds benchmarks/thresholds.json
+#
+# 'run' prints a JSON report and exits with status 1 if any threshold is exceeded.
+
+def load_app(database_url, upload_folder=None, job_workers=0):
+    # config.py reads the environment at import time, so set it before main is imported.
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['JOB_WORKERS'] = str(job_workers)
+    from main import app, db
+    if upload_folder:
+        app.config['UPLOAD_FOLDER'] = upload_folder
+    return app, db
+
+def echo(message):
+    click.echo(message, err=True)
+
+@click.group()
+def cli():
+    pass
+
+database_option = click.option('--database-url', required=True, envvar='BENCHMARK_DATABASE_URL',
+                               help='Database to seed and benchmark. Never point this at production.')
+upload_option = click.option('--upload-folder', default=None,
+                             help='Where seeded and uploaded photos go (defaults to UPLOAD_FOLDER).')
+
+@cli.command()
+@database_option
+@upload_option
+@click.option('--submissions', default=10000, show_default=True)
+@click.option('--comments', default=50000, show_default=True)
+@click.option('--photos', default=50, show_default=True, help='Distinct GPS-tagged JPEGs shared by the submissions.')
+@click.option('--batch-size', default=10000, show_default=True)
+@click.option('--random-seed', default=1, show_default=True)
+def seed(database_url, upload_folder, submissions, comments, photos, batch_size, random_seed):
+    """Create the schema and fill it with synthetic reports."""
+    app, db = load_app(database_url, upload_folder)
+    from flask_migrate import upgrade
+    from benchmarks.seed import seed as seed_database
+    with app.app_context():
+        upgrade()
+        first_id, last_id = seed_database(submissions, comments, photos, app.config['UPLOAD_FOLDER'],
+                                          batch_size=batch_size, random_seed=random_seed, progress=echo)
+    echo(f"Seeded submissions {first_id}..{last_id}")
+
+@cli.command()
+@click.option('--port', default=5055)
+@click.option('--processes', default=4)
+@upload_option
+def serve(port, processes, upload_folder):
+    """Serve the app with the pre-forking production server (used by 'run --driver server')."""
+    import logging
+    from main import app
+    from server import serve as serve_app
+    if upload_folder:
+        app.config['UPLOAD_FOLDER'] = upload_folder
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    # Warm up first (mapper setup, compiled statements, templates) so the
+    # workers inherit that work instead of each repeating it.
+    app.test_client().get('/')
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    serve_app(app, '127.0.0.1', port, processes)
+
+@cli.command()
+@database_option
+@upload_option
+@click.option('--driver', 'drivers', type=click.Choice(['client', 'server']), multiple=True,
+              help='Run through the Flask test client, a real server, or both (default).')
+@click.option('--scenario', 'scenarios', multiple=True, help='Only run these scenarios (repeatable).')
+@click.option('--requests', default=200, show_default=True, help='Measured requests per scenario.')
+@click.option('--warmup', default=10, show_default=True, help='Unmeasured requests before each scenario.')
+@click.option('--concurrency', default=8, show_default=True, help='Client threads for the server driver.')
+@click.option('--processes', default=4, show_default=True, help='Server worker processes.')
+@click.option('--port', default=5055, show_default=True)
+@click.option('--server-command', default=None,
+              help="Start this instead of the built-in server, e.g. 'gunicorn -w 4 -b 127.0.0.1:{port} main:app'.")
+@click.option('--thresholds', 'thresholds_path', type=click.Path(exists=True, dir_okay=False), default=None)
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='Also write the report here.')
+def run(database_url, upload_folder, drivers, scenarios, requests, warmup, concurrency, processes, port,
+        server_command, thresholds_path, output):
+    """Benchmark the routes and report latency, queries per request and throughput."""
+    app, db = load_app(database_url, upload_folder)
+    from models import Submission
+    from benchmarks.drivers import ClientDriver, ServerDriver, ServerProcess, summarize, werkzeug_command
+    from benchmarks.report import check, load_thresholds
+    from benchmarks.scenarios import SCENARIOS, Context
+
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise click.BadParameter(f"Unknown scenarios: {', '.join(sorted(unknown))}", param_hint='--scenario')
+    selected = {name: SCENARIOS[name] for name in (scenarios or SCENARIOS)}
+    with app.app_context():
+        first_id, last_id = db.session.query(db.func.min(Submission.id), db.func.max(Submission.id)).one()
+        total = db.session.query(db.func.count(Submission.id)).scalar()
+        dialect = db.engine.dialect.name
+    if first_id is None:
+        raise click.ClickException("The benchmark database is empty; run 'python -m benchmarks seed' first")
+    ctx = Context(first_id, last_id)
+    started_at = datetime.utcnow()
+
+    def measure(driver, label):
+        results = {}
+        for name, (build, login) in selected.items():
+            echo(f"[{label}] {name}")
+            results[name] = summarize(driver.run(build, ctx, requests, warmup=warmup, login=login))
+        return results
+
+    results = {}
+    drivers = drivers or ('client', 'server')
+    if 'client' in drivers:
+        results['client'] = measure(ClientDriver(app, db), 'client')
+    if 'server' in drivers:
+        upload_folder = upload_folder or app.config['UPLOAD_FOLDER']
+        command = (shlex.split(server_command.format(port=port)) if server_command
+                   else werkzeug_command(port, processes, upload_folder))
+        with ServerProcess(command, port, env={'DATABASE_URL': database_url, 'JOB_WORKERS': '0'}):
+            results['server'] = measure(ServerDriver(f"http://127.0.0.1:{port}", concurrency), 'server')
+
+    failures = check(results, load_thresholds(thresholds_path))
+    report = {
+        'started_at': started_at.isoformat(),
+        'database': dialect,
+        'submissions': total,
+        'python': platform.python_version(),
+        'settings': {'requests': requests, 'warmup': warmup, 'concurrency': concurrency, 'processes': processes},
+        'results': results,
+        'failures': failures,
+    }
+    text = json.dumps(report, indent=2)
+    click.echo(text)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,189 @@
+import http.client
+import http.cookiejar
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from sqlalchemy import event
+from benchmarks.seed import BENCH_USER
+
+class Sample:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.queries = []
+        self.elapsed = 0.0
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def summarize(sample):
+    count = len(sample.latencies)
+    result = {
+        'requests': count,
+        'errors': sample.errors,
+        'p50_ms': round(percentile(sample.latencies, 50) * 1000, 3) if count else None,
+        'p99_ms': round(percentile(sample.latencies, 99) * 1000, 3) if count else None,
+        'max_ms': round(max(sample.latencies) * 1000, 3) if count else None,
+        'throughput_rps': round(count / sample.elapsed, 1) if sample.elapsed else None,
+    }
+    if sample.queries:
+        result['queries_per_request'] = round(sum(sample.queries) / len(sample.queries), 2)
+        result['max_queries'] = max(sample.queries)
+    return result
+
+class ClientDriver:
+    # In-process requests through the Flask test client. Latency here is the
+    # cost of the view itself (no network, no WSGI server), and every SQL
+    # statement is counted.
+    def __init__(self, app, db):
+        self.app = app
+        self.db = db
+        self._queries = 0
+        self._clients = {}
+
+    def _count_query(self, *args):
+        self._queries += 1
+
+    def _client(self, login):
+        if login not in self._clients:
+            client = self.app.test_client()
+            if login:
+                response = client.post('/login', data={'username': BENCH_USER[0], 'password': BENCH_USER[1]})
+                if response.status_code != 302:
+                    raise RuntimeError('Could not log in as the benchmark moderator; was the database seeded?')
+            self._clients[login] = client
+        return self._clients[login]
+
+    def run(self, build, ctx, requests, warmup=0, login=False):
+        client = self._client(login)
+        sample = Sample()
+        with self.app.app_context():
+            engine = self.db.engine
+        event.listen(engine, 'before_cursor_execute', self._count_query)
+        try:
+            started = time.perf_counter()
+            for i in range(warmup + requests):
+                request = build(ctx)
+                self._queries = 0
+                request_started = time.perf_counter()
+                response = client.open(request.path, method=request.method, data=request.body,
+                                       content_type=request.content_type)
+                latency = time.perf_counter() - request_started
+                response.close()
+                if i < warmup:
+                    started = time.perf_counter()
+                    continue
+                sample.latencies.append(latency)
+                sample.queries.append(self._queries)
+                if response.status_code >= 400:
+                    sample.errors += 1
+            sample.elapsed = time.perf_counter() - started
+        finally:
+            event.remove(engine, 'before_cursor_execute', self._count_query)
+        return sample
+
+class ServerProcess:
+    # Runs the app in a separate multi-process server for the HTTP driver.
+    def __init__(self, command, port, env=None, startup_timeout=30):
+        self.command = command
+        self.port = port
+        self.env = env
+        self.startup_timeout = startup_timeout
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, env={**os.environ, **(self.env or {})})
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with status {self.process.returncode}")
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=0.5).close()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__(None, None, None)
+        raise RuntimeError(f"Server did not start listening on port {self.port}")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+def werkzeug_command(port, processes, upload_folder):
+    return [sys.executable, '-m', 'benchmarks', 'serve', '--port', str(port),
+            '--processes', str(processes), '--upload-folder', upload_folder]
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class ServerDriver:
+    # Real HTTP requests from `concurrency` threads against a running server.
+    def __init__(self, base_url, concurrency=8):
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+
+    def _opener(self, login):
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+                                             _NoRedirect())
+        if login:
+            body = f"username={BENCH_USER[0]}&password={BENCH_USER[1]}".encode()
+            self._send(opener, 'POST', '/login', body, 'application/x-www-form-urlencoded')
+        return opener
+
+    def _send(self, opener, method, path, body, content_type):
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        if content_type:
+            request.add_header('Content-Type', content_type)
+        try:
+            with opener.open(request, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+        except (urllib.error.URLError, http.client.HTTPException, OSError):
+            return 599
+
+    def run(self, build, ctx, requests, warmup=0, login=False):
+        sample = Sample()
+        lock = threading.Lock()
+        # Request bodies are built up front so generating JPEGs is not timed.
+        pending = [build(ctx) for _ in range(warmup + requests)]
+        warm = threading.Barrier(self.concurrency + 1)
+
+        def work(opener, mine):
+            for request in mine[:warmup]:
+                self._send(opener, *request)
+            warm.wait()
+            for request in mine[warmup:]:
+                request_started = time.perf_counter()
+                status = self._send(opener, *request)
+                latency = time.perf_counter() - request_started
+                with lock:
+                    sample.latencies.append(latency)
+                    if status >= 400:
+                        sample.errors += 1
+
+        per_thread = [pending[:warmup] + pending[warmup + i::self.concurrency] for i in range(self.concurrency)]
+        threads = [threading.Thread(target=work, args=(self._opener(login), mine), daemon=True)
+                   for mine in per_thread]
+        for thread in threads:
+            thread.start()
+        warm.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        sample.elapsed = time.perf_counter() - started
+        return sample
@@ -0,0 +1,49 @@
+import io
+import random
+from PIL import Image, ImageDraw
+from exif import GPS_IFD_POINTER
+
+# Colorado's bounding box (south, west, north, east).
+COLORADO = (37.0, -109.05, 41.0, -102.05)
+
+def random_coordinates(rng):
+    south, west, north, east = COLORADO
+    return rng.uniform(south, north), rng.uniform(west, east)
+
+def _dms(value):
+    value = abs(value)
+    degrees = int(value)
+    minutes = int((value - degrees) * 60)
+    seconds = round((value - degrees - minutes / 60) * 3600, 4)
+    return (float(degrees), float(minutes), seconds)
+
+def gps_jpeg(latitude, longitude, seed, size=(1600, 1200), quality=85):
+    # A camera-sized JPEG with a GPS IFD, drawn from random shapes so every
+    # seed gives different bytes and a different perceptual hash.
+    rng = random.Random(seed)
+    image = Image.new('RGB', size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    width, height = size
+    for _ in range(40):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(20, width // 2), y0 + rng.randrange(20, height // 2)
+        fill = tuple(rng.randrange(256) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.rectangle((x0, y0, x1, y1), fill=fill)
+        else:
+            draw.ellipse((x0, y0, x1, y1), fill=fill)
+
+    exif = Image.Exif()
+    gps = exif.get_ifd(GPS_IFD_POINTER)
+    gps[1] = 'N' if latitude >= 0 else 'S'
+    gps[2] = _dms(latitude)
+    gps[3] = 'E' if longitude >= 0 else 'W'
+    gps[4] = _dms(longitude)
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality, exif=exif)
+    return buffer.getvalue()
+
+def unique_copy(data, rng):
+    # Bytes after the JPEG end-of-image marker are ignored by decoders but
+    # change the SHA-256, so each upload is stored as a new blob.
+    return data + rng.randbytes(16)
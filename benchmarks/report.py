@@ -0,0 +1,35 @@
+import json
+
+# Threshold keys and how a measured value is compared against them.
+LIMITS = {
+    'p50_ms': max,
+    'p99_ms': max,
+    'queries_per_request': max,
+    'max_queries': max,
+    'errors': max,
+    'throughput_rps': min,
+}
+
+def load_thresholds(path):
+    if not path:
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def check(results, thresholds):
+    # results: {driver: {scenario: summary}}; thresholds has the same shape,
+    # with '*' as a fallback for scenarios that have no entry of their own.
+    failures = []
+    for driver, scenarios in results.items():
+        limits_for_driver = thresholds.get(driver, {})
+        for scenario, summary in scenarios.items():
+            limits = {**limits_for_driver.get('*', {}), **limits_for_driver.get(scenario, {})}
+            for key, limit in limits.items():
+                value = summary.get(key)
+                if value is None or key not in LIMITS:
+                    continue
+                if (LIMITS[key] is max and value > limit) or (LIMITS[key] is min and value < limit):
+                    bound = 'max' if LIMITS[key] is max else 'min'
+                    failures.append({'driver': driver, 'scenario': scenario, 'metric': key,
+                                     'value': value, bound: limit})
+    return failures
@@ -0,0 +1,79 @@
+import io
+import random
+from collections import namedtuple
+from urllib.parse import urlencode
+from werkzeug.datastructures import FileStorage
+from werkzeug.test import encode_multipart
+from pagination import encode_cursor
+from benchmarks.photos import gps_jpeg, random_coordinates, unique_copy
+from benchmarks.seed import created_at_for
+
+# A request both drivers can send: the Flask test client and a real HTTP server.
+Request = namedtuple('Request', ['method', 'path', 'body', 'content_type'])
+
+class Context:
+    def __init__(self, first_id, last_id, random_seed=2, upload_photos=8):
+        self.first_id = first_id
+        self.last_id = last_id
+        self.rng = random.Random(random_seed)
+        self.upload_photos = [gps_jpeg(*random_coordinates(self.rng), seed=i, size=(1600, 1200))
+                              for i in range(upload_photos)]
+
+    def random_id(self):
+        return self.rng.randint(self.first_id, self.last_id)
+
+def get(path, **params):
+    return Request('GET', f"{path}?{urlencode(params)}" if params else path, None, None)
+
+def index(ctx):
+    return get('/')
+
+def index_deep(ctx):
+    # A feed page somewhere in the middle of the table, reached by cursor.
+    submission_id = ctx.random_id()
+    cursor = encode_cursor('feed', 'next', [created_at_for(submission_id - ctx.first_id), submission_id])
+    return get('/', cursor=cursor)
+
+def submission_detail(ctx):
+    return get(f"/submission/{ctx.random_id()}")
+
+def add_comment(ctx):
+    body = urlencode({'submission_id': ctx.random_id(), 'content': 'Benchmark comment: pothole still there.'})
+    return Request('POST', '/comment', body.encode(), 'application/x-www-form-urlencoded')
+
+def submit_report(ctx):
+    photo = unique_copy(ctx.rng.choice(ctx.upload_photos), ctx.rng)
+    boundary, body = encode_multipart({
+        'location': 'Benchmark upload, Colfax Ave',
+        'photo': FileStorage(io.BytesIO(photo), filename='benchmark.jpg', content_type='image/jpeg'),
+    })
+    return Request('POST', '/submit_report', body, f"multipart/form-data; boundary={boundary}")
+
+def moderator(sort_by, sort_order):
+    def build(ctx):
+        return get('/moderator', sort_by=sort_by, sort_order=sort_order)
+    return build
+
+def moderator_deep(sort_by, sort_order):
+    # Second page of the listing; for created_at also a random deep page.
+    def build(ctx):
+        params = {'sort_by': sort_by, 'sort_order': sort_order}
+        if sort_by == 'created_at':
+            submission_id = ctx.random_id()
+            params['cursor'] = encode_cursor(f"created_at.{sort_order}", 'next',
+                                             [created_at_for(submission_id - ctx.first_id), submission_id])
+        return get('/moderator', **params)
+    return build
+
+# name -> (request builder, needs a logged-in moderator)
+SCENARIOS = {
+    'index': (index, False),
+    'index_deep': (index_deep, False),
+    'submission_detail': (submission_detail, False),
+    'add_comment': (add_comment, False),
+    'submit_report': (submit_report, False),
+}
+for _sort_by in ('created_at', 'location', 'comments'):
+    for _sort_order in ('desc', 'asc'):
+        SCENARIOS[f"moderator_{_sort_by}_{_sort_order}"] = (moderator(_sort_by, _sort_order), True)
+SCENARIOS['moderator_created_at_desc_deep'] = (moderator_deep('created_at', 'desc'), True)
@@ -0,0 +1,88 @@
+import io
+import os
+import random
+from datetime import datetime, timedelta
+from models import db, Submission, Comment, Blob, Admin, SiteStat, CacheVersion
+from storage import save_stream, perceptual_hash
+from images import generate_variants
+from geo import geohash_encode
+from benchmarks.photos import gps_jpeg, random_coordinates
+import search
+
+STREETS = ['Colfax Ave', 'Broadway', 'Federal Blvd', 'Speer Blvd', 'Alameda Ave', 'Colorado Blvd',
+           'Academy Blvd', 'Pearl St', 'College Ave', 'Main St', 'Wadsworth Blvd', 'Santa Fe Dr']
+CITIES = ['Denver', 'Boulder', 'Colorado Springs', 'Fort Collins', 'Aurora', 'Pueblo', 'Lakewood', 'Grand Junction']
+COMMENTS = ['Still there this morning, nearly lost a hubcap.', 'The city patched it last year and it came back.',
+            'Deep enough to flatten a tire.', 'Reported to 311 as well.', 'Cyclists have to swerve into traffic here.',
+            'Water pools in it whenever it rains.', 'Getting worse every week.']
+# Spacing between seeded created_at values; the run uses it to build feed cursors.
+SUBMISSION_INTERVAL = timedelta(seconds=30)
+START = datetime(2020, 1, 1)
+BENCH_USER = ('bench', 'bench')
+
+def created_at_for(index):
+    return START + index * SUBMISSION_INTERVAL
+
+def seed_photos(count, upload_folder, rng, progress):
+    photos = []
+    for i in range(count):
+        latitude, longitude = random_coordinates(rng)
+        sha256, path, size = save_stream(io.BytesIO(gps_jpeg(latitude, longitude, seed=rng.random())),
+                                         upload_folder, 'jpg')
+        blob, _ = Blob.get_or_create(sha256, path, size)
+        blob.set_phash(perceptual_hash(os.path.join(upload_folder, path)))
+        generate_variants(path, upload_folder)
+        photos.append((blob, latitude, longitude))
+        progress(f"photos: {i + 1}/{count}")
+    db.session.commit()
+    return [(blob.id, blob.path, latitude, longitude) for blob, latitude, longitude in photos]
+
+def seed(submissions, comments, photos, upload_folder, batch_size=10000, random_seed=1, progress=print):
+    if db.session.query(Submission.id).first() is not None:
+        raise RuntimeError('The benchmark database already has submissions; seed an empty database')
+    rng = random.Random(random_seed)
+
+    if not Admin.query.filter_by(username=BENCH_USER[0]).first():
+        admin = Admin(username=BENCH_USER[0])
+        admin.set_password(BENCH_USER[1])
+        db.session.add(admin)
+        db.session.commit()
+
+    pool = seed_photos(photos, upload_folder, rng, progress)
+
+    # Bulk inserts skip the mapper hooks; counters and the search index are
+    # rebuilt once at the end instead.
+    for start in range(0, submissions, batch_size):
+        rows = []
+        for i in range(start, min(start + batch_size, submissions)):
+            blob_id, path, _, _ = pool[i % len(pool)]
+            latitude, longitude = random_coordinates(rng)
+            status = rng.choices(('active', 'on_hold', 'pending'), weights=(90, 7, 3))[0]
+            rows.append({'photo': path, 'blob_id': blob_id, 'status': status, 'created_at': created_at_for(i),
+                         'location': f"{rng.randrange(100, 9900, 100)} block of {rng.choice(STREETS)}, {rng.choice(CITIES)}",
+                         'latitude': latitude, 'longitude': longitude, 'geohash': geohash_encode(latitude, longitude)})
+        db.session.execute(db.insert(Submission), rows)
+        db.session.commit()
+        progress(f"submissions: {start + len(rows)}/{submissions}")
+
+    first_id, last_id = db.session.query(db.func.min(Submission.id), db.func.max(Submission.id)).one()
+    for start in range(0, comments, batch_size):
+        rows = []
+        for _ in range(start, min(start + batch_size, comments)):
+            # Skewed towards recent submissions, like real traffic.
+            offset = int((last_id - first_id) * rng.random() ** 0.3)
+            rows.append({'submission_id': first_id + offset, 'content': rng.choice(COMMENTS),
+                         'created_at': created_at_for(offset) + timedelta(minutes=rng.randrange(1, 10000))})
+        db.session.execute(db.insert(Comment), rows)
+        db.session.commit()
+        progress(f"comments: {start + len(rows)}/{comments}")
+
+    progress('updating comment counts, counters and search index')
+    db.session.execute(db.update(Submission).values(comment_count=db.select(db.func.count(Comment.id))
+                                                    .where(Comment.submission_id == Submission.id)
+                                                    .scalar_subquery()))
+    SiteStat.reconcile()
+    search.rebuild(db.session.connection())
+    CacheVersion.bump('feed')
+    db.session.commit()
+    return first_id, last_id
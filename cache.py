@@ -0,0 +1,56 @@
+import threading
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class VersionMemo:
+    # Remembers a CacheVersion value for check_interval seconds so hot read
+    # paths don't query it on every request.
+    def __init__(self, loader, check_interval=1.0):
+        self.loader = loader
+        self.check_interval = check_interval
+        self._value = None
+        self._checked_at = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        if self._value is None or now - self._checked_at >= self.check_interval:
+            self._value = self.loader()
+            self._checked_at = now
+        return self._value
+
+    def invalidate(self):
+        self._value = None
+
+page_cache = LRUCache()
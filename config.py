@@ -1,10 +1,63 @@
 import os
+import secrets
+
+def load_secret_key(instance_path):
+    # Every worker process (and every restart) must sign sessions with the
+    # same key. Without SECRET_KEY in the environment, one is generated once
+    # and kept in the instance folder; several workers starting at the same
+    # time all end up reading whichever file was linked into place first.
+    path = os.path.join(instance_path, 'secret_key')
+    if not os.path.exists(path):
+        os.makedirs(instance_path, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}"
+        with open(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'w') as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+    with open(path) as f:
+        return f.read().strip()
+
+def engine_options(uri):
+    # pool_pre_ping swaps out connections the server has dropped (restarts,
+    # idle timeouts) before a request gets one; pool_recycle retires them
+    # before the usual idle cutoffs. Pools are per worker process, so the
+    # database must allow workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+    options = {'pool_pre_ping': True, 'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800))}
+    if uri and not uri.startswith('sqlite'):
+        options.update(pool_size=int(os.environ.get('DB_POOL_SIZE', 10)),
+                       max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+                       pool_timeout=float(os.environ.get('DB_POOL_TIMEOUT', 30)))
+    return options
 
 class Config:
-    SECRET_KEY = os.urandom(32)
+    SECRET_KEY = os.environ.get('SECRET_KEY')  # required when workers run on more than one machine
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     if SQLALCHEMY_DATABASE_URI and SQLALCHEMY_DATABASE_URI.startswith("postgres://"):
         SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI.replace("postgres://", "postgresql://", 1)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
     UPLOAD_FOLDER = 'static/uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload size
+    CONTENT_CACHE_CHECK_INTERVAL = float(os.environ.get('CONTENT_CACHE_CHECK_INTERVAL', 5.0))  # seconds between version checks
+    CONTENT_CACHE_TTL = float(os.environ.get('CONTENT_CACHE_TTL', 300.0))  # seconds before a forced reload
+    FEED_VERSION_CHECK_INTERVAL = float(os.environ.get('FEED_VERSION_CHECK_INTERVAL', 1.0))  # seconds other workers' writes may go unseen
+    PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 512))  # rendered public pages kept per process
+    DUPLICATE_PHASH_DISTANCE = 3  # max differing bits between perceptual hashes of probable duplicates
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))  # 0 disables the in-process worker pool
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 2.0))
+    JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', 300))
+    SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))  # requests slower than this are logged with their SQL
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', '1') != '0'  # Server-Timing response header
+    LIVE_UPDATES_BACKEND = os.environ.get('LIVE_UPDATES_BACKEND', 'auto')  # 'postgres' (LISTEN/NOTIFY across workers), 'local' or 'auto'
+    SSE_MAX_CLIENTS = int(os.environ.get('SSE_MAX_CLIENTS', 1000))  # open /events connections per process
+    SSE_KEEPALIVE = float(os.environ.get('SSE_KEEPALIVE', 15.0))  # seconds between keepalive comments
+    WEB_WORKERS = int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1))  # processes for 'flask serve'
+    WEB_MAX_REQUESTS = int(os.environ.get('WEB_MAX_REQUESTS', 10000))  # requests before a worker is replaced; 0 never
+    WEB_MAX_REQUESTS_JITTER = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', 1000))
+    WEB_GRACEFUL_TIMEOUT = float(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))  # seconds to finish in-flight requests
+    TAILWIND_CSS_URL = os.environ.get('TAILWIND_CSS_URL', 'https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css')  # purged by 'flask build-assets'
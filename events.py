@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+from collections import deque, namedtuple
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from models import db, Submission, Comment
+
+logger = logging.getLogger(__name__)
+
+# Live feed updates. Committed changes to submissions and comments become
+# small events ({'type': ..., 'id': ...}); every process turns each event
+# into an HTML fragment once and appends it to a shared ring buffer that all
+# of its /events (Server-Sent Events) connections read from.
+#
+# With several worker processes on Postgres, events travel between them via
+# NOTIFY, which is transactional: listeners only hear about committed rows.
+# Without Postgres, events are only seen by the process that made the change.
+
+NOTIFY_CHANNEL = 'live_updates'
+# More events than this in one transaction (bulk moderation) are collapsed
+# into a single 'reset' telling clients to reload instead.
+MAX_EVENTS_PER_TRANSACTION = 50
+
+Event = namedtuple('Event', ['seq', 'name', 'data'])
+
+class Broadcast:
+    # A ring buffer of rendered events plus a condition variable. A client
+    # only remembers the last sequence number it has seen, so an idle
+    # connection costs one waiting thread (or greenlet) and no queue.
+    def __init__(self, capacity=256):
+        self.token = os.urandom(4).hex()
+        self._events = deque(maxlen=capacity)
+        self._seq = 0
+        self._condition = threading.Condition()
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def publish(self, name, data):
+        with self._condition:
+            self._seq += 1
+            self._events.append(Event(self._seq, name, data))
+            self._condition.notify_all()
+
+    def wait(self, after, timeout):
+        # Events newer than `after`; [] on timeout; None if some were already
+        # dropped from the buffer and the client has to resynchronise.
+        with self._condition:
+            if self._seq <= after:
+                self._condition.wait(timeout)
+            if self._events and self._events[0].seq > after + 1:
+                return None
+            return [e for e in self._events if e.seq > after]
+
+class LiveUpdates:
+    def __init__(self, app=None, render=None):
+        self.app = None
+        self.render = render
+        self.broadcast = Broadcast()
+        self.clients = 0
+        self._incoming = queue.Queue()
+        self._lock = threading.Lock()
+        self._started_pid = None
+        self.backend = None
+        if app is not None:
+            self.init_app(app, render)
+
+    def init_app(self, app, render=None):
+        self.app = app
+        if render is not None:
+            self.render = render
+        app.config.setdefault('LIVE_UPDATES_BACKEND', 'auto')
+        app.config.setdefault('SSE_MAX_CLIENTS', 1000)
+        app.config.setdefault('SSE_KEEPALIVE', 15.0)
+        app.extensions['live_updates'] = self
+
+    def _choose_backend(self):
+        setting = self.app.config['LIVE_UPDATES_BACKEND']
+        with self.app.app_context():
+            dialect, driver = db.engine.dialect.name, db.engine.dialect.driver
+        if setting == 'postgres' or (setting == 'auto' and dialect == 'postgresql'):
+            if driver != 'psycopg2':
+                logger.warning(f"Live updates need psycopg2 for LISTEN/NOTIFY, not {driver}; using in-process delivery")
+                return 'local'
+            return 'postgres'
+        return 'local'
+
+    def start(self):
+        # Threads are started lazily and per process, so forking servers
+        # never inherit a half-started listener from the parent.
+        if self._started_pid == os.getpid():
+            return
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            if self._started_pid is not None:
+                # Forked from a process that had already started: start afresh.
+                self.broadcast = Broadcast()
+                self._incoming = queue.Queue()
+            self.backend = self._choose_backend()
+            threading.Thread(target=self._dispatch, name='live-dispatch', daemon=True).start()
+            if self.backend == 'postgres':
+                threading.Thread(target=self._listen, name='live-listen', daemon=True).start()
+            self._started_pid = os.getpid()
+
+    def publish(self, session, events):
+        # Called while the transaction is still open.
+        self.start()
+        if len(events) > MAX_EVENTS_PER_TRANSACTION:
+            events = [{'type': 'reset'}]
+        if self.backend == 'postgres':
+            connection = session.connection()
+            for item in events:
+                connection.execute(text("SELECT pg_notify(:channel, :payload)"),
+                                   {'channel': NOTIFY_CHANNEL, 'payload': json.dumps(item)})
+        else:
+            session.info.setdefault('live_events', []).extend(events)
+
+    def committed(self, events):
+        for item in events:
+            self._incoming.put(item)
+
+    def _dispatch(self):
+        while True:
+            item = self._incoming.get()
+            if not self.clients:
+                # Nobody to render for; anyone reconnecting from before this
+                # point is told to reload instead.
+                self.broadcast.publish('reset', {})
+                continue
+            try:
+                with self.app.app_context(), self.app.test_request_context('/'):
+                    rendered = self.render(item)
+                if rendered:
+                    self.broadcast.publish(*rendered)
+            except Exception as e:
+                logger.error(f"Could not render live update {item!r}: {str(e)}")
+
+    def _listen(self):
+        delay = 1
+        while True:
+            try:
+                with self.app.app_context():
+                    connection = db.engine.raw_connection()
+                try:
+                    pg = connection.driver_connection
+                    pg.set_session(autocommit=True)
+                    with pg.cursor() as cursor:
+                        cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    delay = 1
+                    while True:
+                        if select.select([pg], [], [], 60) == ([], [], []):
+                            continue
+                        pg.poll()
+                        while pg.notifies:
+                            notification = pg.notifies.pop(0)
+                            self._incoming.put(json.loads(notification.payload))
+                finally:
+                    connection.invalidate()
+            except Exception as e:
+                logger.error(f"Live update listener error, reconnecting in {delay}s: {str(e)}")
+                time.sleep(delay)
+                delay = min(delay * 2, 60)
+
+    @property
+    def full(self):
+        return self.clients >= self.app.config['SSE_MAX_CLIENTS']
+
+    def stream(self, last_event_id=None):
+        # Yields SSE frames; holds no database connection or app context.
+        self.start()
+        keepalive = self.app.config['SSE_KEEPALIVE']
+        with self._lock:
+            self.clients += 1
+        after = self.broadcast.last_seq
+        token, _, seq = (last_event_id or '').partition(':')
+        if token == self.broadcast.token and seq.isdigit():
+            after = int(seq)
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                events = self.broadcast.wait(after, keepalive)
+                if events is None:
+                    after = self.broadcast.last_seq
+                    yield 'event: reset\ndata: {}\n\n'
+                    continue
+                if not events:
+                    yield ': keepalive\n\n'
+                    continue
+                for item in events:
+                    after = item.seq
+                    yield f"id: {self.broadcast.token}:{item.seq}\nevent: {item.name}\ndata: {json.dumps(item.data)}\n\n"
+        finally:
+            with self._lock:
+                self.clients -= 1
+
+def _changes(session):
+    events = []
+    for obj in session.new:
+        if isinstance(obj, Submission) and obj.status == 'active':
+            events.append({'type': 'submission', 'id': obj.id})
+        elif isinstance(obj, Comment):
+            events.append({'type': 'comment', 'id': obj.id, 'submission_id': obj.submission_id})
+    for obj in session.dirty:
+        if isinstance(obj, Submission):
+            status = get_history(obj, 'status')
+            if status.has_changes():
+                was_active = 'active' in (status.deleted or ())
+                if obj.status == 'active' or was_active:
+                    events.append({'type': 'submission' if obj.status == 'active' else 'removed', 'id': obj.id})
+            elif obj.status == 'active' and get_history(obj, 'location').has_changes():
+                events.append({'type': 'submission', 'id': obj.id})
+        elif isinstance(obj, Comment) and get_history(obj, 'content').has_changes():
+            events.append({'type': 'comment', 'id': obj.id, 'submission_id': obj.submission_id})
+    for obj in session.deleted:
+        if isinstance(obj, Submission):
+            events.append({'type': 'removed', 'id': obj.id})
+        elif isinstance(obj, Comment):
+            events.append({'type': 'comment_removed', 'id': obj.id, 'submission_id': obj.submission_id})
+    return events
+
+def _extension():
+    try:
+        return current_app.extensions.get('live_updates')
+    except RuntimeError:
+        return None
+
+def publish(events, session=None):
+    # For code paths that bypass the ORM (bulk UPDATE/DELETE).
+    live = _extension()
+    if live is not None and events:
+        live.publish(session or db.session(), events)
+
+@event.listens_for(Session, 'after_flush')
+def collect_live_events(session, flush_context):
+    live = _extension()
+    if live is not None:
+        events = _changes(session)
+        if events:
+            live.publish(session, events)
+
+@event.listens_for(Session, 'after_commit')
+def deliver_live_events(session):
+    events = session.info.pop('live_events', None)
+    live = _extension()
+    if events and live is not None:
+        if len(events) > MAX_EVENTS_PER_TRANSACTION:
+            events = [{'type': 'reset'}]
+        live.committed(events)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_live_events(session):
+    session.info.pop('live_events', None)
@@ -0,0 +1,133 @@
+import struct
+
+# Reads GPS coordinates straight from the EXIF block of a JPEG (APP1 segment)
+# or PNG (eXIf chunk) without decoding the image. Only the container headers
+# and the GPS IFD are parsed, which usually means reading a few kilobytes.
+
+JPEG_SOI = b'\xff\xd8'
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+EXIF_HEADER = b'Exif\x00\x00'
+GPS_IFD_POINTER = 0x8825
+GPS_LATITUDE_REF, GPS_LATITUDE, GPS_LONGITUDE_REF, GPS_LONGITUDE = 1, 2, 3, 4
+TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+
+class ExifError(Exception):
+    pass
+
+def read_gps(path):
+    with open(path, 'rb') as f:
+        signature = f.read(8)
+        f.seek(0)
+        if signature.startswith(JPEG_SOI):
+            tiff = _jpeg_exif(f)
+        elif signature == PNG_SIGNATURE:
+            tiff = _png_exif(f)
+        else:
+            raise ExifError('Unsupported image format')
+    if tiff is None:
+        return None
+    return _gps_from_tiff(tiff)
+
+def _jpeg_exif(f):
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xff:
+            raise ExifError('Malformed JPEG marker')
+        kind = marker[1]
+        if kind == 0xff:  # fill byte
+            f.seek(-1, 1)
+            continue
+        if kind in (0xd9, 0xda):  # end of image / start of scan: no more metadata
+            return None
+        if 0xd0 <= kind <= 0xd7 or kind == 0x01:
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            raise ExifError('Truncated JPEG segment')
+        length = struct.unpack('>H', length_bytes)[0] - 2
+        if kind == 0xe1:
+            data = f.read(length)
+            if data.startswith(EXIF_HEADER):
+                return data[len(EXIF_HEADER):]
+        else:
+            f.seek(length, 1)
+
+def _png_exif(f):
+    f.seek(8)
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        length, chunk_type = struct.unpack('>I4s', header)
+        if chunk_type == b'eXIf':
+            return f.read(length)
+        if chunk_type == b'IEND':
+            return None
+        f.seek(length + 4, 1)  # skip data and CRC
+
+def _gps_from_tiff(tiff):
+    if len(tiff) < 8:
+        raise ExifError('Truncated TIFF header')
+    order = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+    if order is None or struct.unpack(order + 'H', tiff[2:4])[0] != 42:
+        raise ExifError('Invalid TIFF header')
+    ifd0 = struct.unpack(order + 'I', tiff[4:8])[0]
+    gps_offset = _read_ifd(tiff, order, ifd0, {GPS_IFD_POINTER}).get(GPS_IFD_POINTER)
+    if gps_offset is None:
+        return None
+    gps = _read_ifd(tiff, order, gps_offset, {GPS_LATITUDE_REF, GPS_LATITUDE, GPS_LONGITUDE_REF, GPS_LONGITUDE})
+    lat, lat_ref = gps.get(GPS_LATITUDE), gps.get(GPS_LATITUDE_REF)
+    lon, lon_ref = gps.get(GPS_LONGITUDE), gps.get(GPS_LONGITUDE_REF)
+    if not all([lat, lat_ref, lon, lon_ref]):
+        return None
+    latitude, longitude = _dms_to_degrees(lat), _dms_to_degrees(lon)
+    if latitude is None or longitude is None:
+        return None
+    if lat_ref != 'N':
+        latitude = -latitude
+    if lon_ref != 'E':
+        longitude = -longitude
+    return {'latitude': latitude, 'longitude': longitude}
+
+def _read_ifd(tiff, order, offset, wanted):
+    if offset + 2 > len(tiff):
+        raise ExifError('IFD offset out of range')
+    count = struct.unpack(order + 'H', tiff[offset:offset + 2])[0]
+    values = {}
+    for i in range(count):
+        entry = offset + 2 + i * 12
+        if entry + 12 > len(tiff):
+            raise ExifError('Truncated IFD')
+        tag, value_type, components = struct.unpack(order + 'HHI', tiff[entry:entry + 8])
+        if tag not in wanted:
+            continue
+        size = TYPE_SIZES.get(value_type, 1) * components
+        if size <= 4:
+            data = tiff[entry + 8:entry + 8 + size]
+        else:
+            data_offset = struct.unpack(order + 'I', tiff[entry + 8:entry + 12])[0]
+            data = tiff[data_offset:data_offset + size]
+            if len(data) < size:
+                raise ExifError('IFD value out of range')
+        values[tag] = _decode(order, value_type, components, data)
+    return values
+
+def _decode(order, value_type, components, data):
+    if value_type == 2:
+        return data.split(b'\x00', 1)[0].decode('ascii', 'replace').strip()
+    if value_type in (5, 10):
+        fmt = order + ('I' if value_type == 5 else 'i') * (components * 2)
+        raw = struct.unpack(fmt, data)
+        return [(raw[i], raw[i + 1]) for i in range(0, len(raw), 2)]
+    if value_type == 4:
+        return struct.unpack(order + 'I', data[:4])[0]
+    if value_type == 3:
+        return struct.unpack(order + 'H', data[:2])[0]
+    return data
+
+def _dms_to_degrees(parts):
+    if len(parts) != 3 or any(den == 0 for _, den in parts):
+        return None
+    degrees, minutes, seconds = (num / den for num, den in parts)
+    return degrees + minutes / 60 + seconds / 3600
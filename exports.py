@@ -0,0 +1,88 @@
+import csv
+import io
+import json
+import logging
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import selectinload
+from models import db, Submission
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = 1000
+CSV_COLUMNS = ['id', 'created_at', 'status', 'location', 'latitude', 'longitude', 'photo_url',
+               'duplicate_of', 'comment_count', 'comments']
+
+def iter_batches(conditions, batch_size=EXPORT_BATCH_SIZE):
+    # Keyset batches in id order, each read in its own short transaction. A
+    # single server-side cursor would keep one transaction (and on Postgres
+    # its snapshot) open for the whole download, holding back vacuum and
+    # blocking DDL; instead the session is closed after every batch, which
+    # ends the transaction and drops the loaded rows, so memory stays flat.
+    last_id = 0
+    while True:
+        batch = (Submission.query.options(selectinload(Submission.comments))
+                 .filter(*conditions, Submission.id > last_id)
+                 .order_by(Submission.id).limit(batch_size).all())
+        if not batch:
+            return
+        last_id = batch[-1].id
+        yield batch
+        db.session.close()
+
+def _comments(submission):
+    return [{'id': comment.id, 'created_at': comment.created_at.isoformat() if comment.created_at else None,
+             'content': comment.content}
+            for comment in sorted(submission.comments, key=lambda comment: (comment.created_at, comment.id))]
+
+def _stream(batches, chunks):
+    try:
+        yield from chunks(batches)
+    except SQLAlchemyError as e:
+        # Headers are already sent; re-raising aborts the response so the
+        # client sees a failed download rather than a short but valid file.
+        db.session.rollback()
+        logger.error(f"Database error during export: {str(e)}")
+        raise
+
+def csv_export(conditions, photo_url):
+    def chunks(batches):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(CSV_COLUMNS)
+        yield buffer.getvalue()
+        for batch in batches:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for submission in batch:
+                writer.writerow([submission.id, submission.created_at.isoformat() if submission.created_at else '',
+                                 submission.status, submission.location, submission.latitude, submission.longitude,
+                                 photo_url(submission.photo), submission.duplicate_of_id, submission.comment_count,
+                                 json.dumps(_comments(submission))])
+            yield buffer.getvalue()
+    return _stream(iter_batches(conditions), chunks)
+
+def geojson_export(conditions, photo_url):
+    # A FeatureCollection written feature by feature; reports without
+    # coordinates are included with a null geometry.
+    def chunks(batches):
+        yield '{"type": "FeatureCollection", "features": ['
+        separator = '\n'
+        for batch in batches:
+            features = []
+            for submission in batch:
+                geometry = None
+                if submission.latitude is not None and submission.longitude is not None:
+                    geometry = {'type': 'Point', 'coordinates': [submission.longitude, submission.latitude]}
+                features.append(json.dumps({'type': 'Feature', 'id': submission.id, 'geometry': geometry, 'properties': {
+                    'location': submission.location,
+                    'status': submission.status,
+                    'created_at': submission.created_at.isoformat() if submission.created_at else None,
+                    'photo_url': photo_url(submission.photo),
+                    'duplicate_of': submission.duplicate_of_id,
+                    'comment_count': submission.comment_count,
+                    'comments': _comments(submission)
+                }}))
+            if features:
+                yield separator + ',\n'.join(features)
+                separator = ',\n'
+        yield '\n]}\n'
+    return _stream(iter_batches(conditions), chunks)
@@ -0,0 +1,72 @@
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 12
+EARTH_RADIUS_M = 6371008.8
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+def cell_size(precision):
+    # Height and width in degrees of a geohash cell at this precision.
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+def covering_cells(south, west, north, east, max_cells=32):
+    # The finest set of geohash prefixes (at most max_cells) whose cells
+    # cover the bounding box. Each prefix becomes one index range scan.
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.floor(north / height) - math.floor(south / height) + 1
+        cols = math.floor(east / width) - math.floor(west / width) + 1
+        if rows * cols <= max_cells:
+            break
+    cells = set()
+    lat = math.floor(south / height) * height
+    while lat <= north:
+        lon = math.floor(west / width) * width
+        while lon <= east:
+            cells.add(geohash_encode(min(max(lat + height / 2, -90.0), 90.0),
+                                     min(max(lon + width / 2, -180.0), 180.0), precision))
+            lon += width
+        lat += height
+    return sorted(cells)
+
+def prefix_range(prefix):
+    # Geohashes sharing a prefix form a contiguous range ('z' is the last base32 digit).
+    return prefix, prefix + 'z' * (GEOHASH_PRECISION - len(prefix))
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+def radius_bbox(latitude, longitude, radius_m):
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlon = math.degrees(radius_m / (EARTH_RADIUS_M * max(math.cos(math.radians(latitude)), 1e-6)))
+    return (max(latitude - dlat, -90.0), max(longitude - dlon, -180.0),
+            min(latitude + dlat, 90.0), min(longitude + dlon, 180.0))
+
+def cluster_precision(zoom):
+    # Cells roughly 64px wide at this web-map zoom level: a 256px tile spans
+    # 360 / 2**zoom degrees and a geohash cell 360 / 2**ceil(5 * precision / 2).
+    return max(1, min(GEOHASH_PRECISION, round(2 * (zoom + 2) / 5)))
@@ -0,0 +1,88 @@
+import os
+from PIL import Image, ImageOps
+from storage import remove_empty_dirs
+
+VARIANT_DIR = 'variants'
+VARIANT_WIDTHS = (320, 640, 1280)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 75, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 78, 'optimize': True, 'progressive': True}),
+}
+
+def variant_name(photo, width, ext):
+    stem, original_ext = os.path.splitext(photo)
+    return f"{VARIANT_DIR}/{stem}-{original_ext.lstrip('.').lower()}-{width}w.{ext}"
+
+def variant_paths(photo, upload_folder):
+    for width in VARIANT_WIDTHS:
+        for ext in VARIANT_FORMATS:
+            yield width, ext, os.path.join(upload_folder, variant_name(photo, width, ext))
+
+def has_variants(photo, upload_folder):
+    return all(os.path.isfile(path) for _, _, path in variant_paths(photo, upload_folder))
+
+def _flatten(image):
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+def delete_photo_files(photo, upload_folder):
+    # Missing files are fine: this runs again when a cleanup job is retried.
+    paths = [os.path.join(upload_folder, photo)] + [path for _, _, path in variant_paths(photo, upload_folder)]
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        remove_empty_dirs(path, upload_folder)
+
+def generate_variants(photo, upload_folder, force=False):
+    if not force and has_variants(photo, upload_folder):
+        return 0
+
+    source_path = os.path.join(upload_folder, photo)
+    written = 0
+    with Image.open(source_path) as image:
+        # Let the JPEG decoder downscale by a power of two while decoding, which
+        # is far cheaper than decoding a 12MP photo at full size.
+        largest = max(VARIANT_WIDTHS)
+        image.draft('RGB', (largest, largest * image.height // max(image.width, 1)))
+        image = ImageOps.exif_transpose(image)
+        image = _flatten(image)
+
+        # Resize from the largest variant down so each step works on fewer pixels.
+        current = image
+        for width in sorted(VARIANT_WIDTHS, reverse=True):
+            if current.width > width:
+                height = max(1, round(current.height * width / current.width))
+                current = current.resize((width, height), Image.LANCZOS)
+            for ext, (fmt, options) in VARIANT_FORMATS.items():
+                target = os.path.join(upload_folder, variant_name(photo, width, ext))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                tmp_path = f"{target}.tmp"
+                current.save(tmp_path, fmt, **options)
+                os.replace(tmp_path, target)
+                written += 1
+    return written
+
+def backfill_variant(args):
+    photo, upload_folder, force = args
+    try:
+        return photo, generate_variants(photo, upload_folder, force=force), None
+    except Exception as e:
+        return photo, 0, str(e)
+
+def iter_original_photos(upload_folder):
+    for root, dirs, files in os.walk(upload_folder):
+        rel_root = os.path.relpath(root, upload_folder)
+        top = rel_root.split(os.sep)[0]
+        if top == VARIANT_DIR or (top.startswith('.') and top != '.'):
+            dirs[:] = []
+            continue
+        for name in files:
+            if name.endswith('.tmp'):
+                continue
+            yield name if rel_root == '.' else os.path.join(rel_root, name).replace(os.sep, '/')
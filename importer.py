@@ -0,0 +1,144 @@
+import csv
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import islice
+from models import db, Submission, Blob, Job, SiteStat
+from storage import save_file
+from utils import allowed_file
+from search import index_submission
+
+logger = logging.getLogger(__name__)
+
+def iter_manifest(path):
+    # CSV and JSON Lines manifests are streamed row by row; a plain JSON
+    # array has to be parsed in one go, so prefer JSON Lines for big imports.
+    ext = path.rsplit('.', 1)[-1].lower()
+    with open(path, newline='', encoding='utf-8') as f:
+        if ext == 'csv':
+            yield from csv.DictReader(f)
+        elif ext in ('jsonl', 'ndjson'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        elif ext == 'json':
+            yield from json.load(f)
+        else:
+            raise ValueError(f"Unsupported manifest type: {path}")
+
+def load_checkpoint(path, manifest):
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('manifest') != os.path.abspath(manifest):
+        raise ValueError(f"Checkpoint {path} belongs to a different manifest ({checkpoint.get('manifest')})")
+    return checkpoint['records']
+
+def save_checkpoint(path, manifest, records):
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'manifest': os.path.abspath(manifest), 'records': records,
+                   'updated_at': datetime.utcnow().isoformat()}, f)
+    os.replace(tmp_path, path)
+
+def parse_created_at(value):
+    if not value:
+        return datetime.utcnow()
+    # Stored as naive UTC like everything else; values without an offset are
+    # taken to be UTC already.
+    created_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return created_at
+
+class ReportImporter:
+    def __init__(self, upload_folder, photo_root, link=False, workers=8, batch_size=2000):
+        self.upload_folder = upload_folder
+        self.photo_root = photo_root
+        self.link = link
+        self.workers = workers
+        self.batch_size = batch_size
+        self.imported = 0
+        self.skipped = 0
+
+    def _store(self, record):
+        photo = (record.get('photo') or '').strip()
+        location = (record.get('location') or '').strip()
+        if not photo or not location:
+            raise ValueError('photo and location are required')
+        if not allowed_file(photo):
+            raise ValueError(f"Invalid file type: {photo}")
+        created_at = parse_created_at(record.get('created_at'))
+        stored = save_file(os.path.join(self.photo_root, photo), self.upload_folder, link=self.link)
+        return stored, location, created_at
+
+    def run(self, manifest, checkpoint=None, on_batch=None):
+        done = load_checkpoint(checkpoint, manifest)
+        records = islice(iter_manifest(manifest), done, None)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                batch = list(islice(records, self.batch_size))
+                if not batch:
+                    break
+                stored = []
+                for record, future in zip(batch, [executor.submit(self._store, r) for r in batch]):
+                    try:
+                        stored.append(future.result())
+                    except Exception as e:
+                        self.skipped += 1
+                        logger.warning(f"Skipping manifest record {record!r}: {str(e)}")
+                self._insert(stored)
+                done += len(batch)
+                save_checkpoint(checkpoint, manifest, done)
+                if on_batch:
+                    on_batch(done, self.imported, self.skipped)
+        return self.imported, self.skipped
+
+    def _insert(self, stored):
+        if not stored:
+            return
+        try:
+            files = {sha256: (path, size) for (sha256, path, size), _, _ in stored}
+            blob_ids, existing = Blob.get_or_create_many(files)
+
+            # Same outcome as submit_report: a 'pending' row plus a processing
+            # job, with exact re-uploads pointing at the latest matching report.
+            latest_by_blob = dict(db.session.query(Submission.blob_id, db.func.max(Submission.id))
+                                  .filter(Submission.blob_id.in_([blob_ids[h] for h in existing]))
+                                  .group_by(Submission.blob_id).all()) if existing else {}
+            rows = [{'photo': path, 'blob_id': blob_ids[sha256], 'location': location,
+                     'created_at': created_at, 'status': 'pending'}
+                    for (sha256, path, size), location, created_at in stored]
+            ids = db.session.execute(db.insert(Submission).returning(Submission.id, sort_by_parameter_order=True),
+                                     rows).scalars().all()
+
+            duplicates = []
+            for submission_id, row in zip(ids, rows):
+                previous = latest_by_blob.get(row['blob_id'])
+                if previous:
+                    duplicates.append({'id': submission_id, 'duplicate_of_id': previous})
+                latest_by_blob[row['blob_id']] = submission_id
+            if duplicates:
+                db.session.execute(db.update(Submission), duplicates)
+
+            connection = db.session.connection()
+            for submission_id, row in zip(ids, rows):
+                index_submission(connection, submission_id, row['location'])
+
+            db.session.execute(db.insert(Job), [{
+                'kind': 'process_submission', 'ref': f"submission:{submission_id}",
+                'payload': json.dumps({'submission_id': submission_id}), 'status': 'queued',
+                'attempts': 0, 'max_attempts': 3, 'run_after': datetime.utcnow()
+            } for submission_id in ids])
+            # Bulk inserts bypass the ORM hooks that keep the counters and search index.
+            SiteStat.apply(connection, {'submissions': len(ids), 'submissions_pending': len(ids)})
+            db.session.commit()
+            self.imported += len(ids)
+        except Exception:
+            db.session.rollback()
+            raise
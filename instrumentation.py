@@ -0,0 +1,207 @@
+import threading
+import time
+from collections import Counter
+from bisect import bisect_left
+from contextlib import contextmanager
+from flask import g, request, has_request_context, abort, before_render_template, template_rendered
+from sqlalchemy import event
+
+# Per-request SQL, template and file I/O timings, reported in a Server-Timing
+# header, logged when slow, and aggregated into histograms served at /metrics.
+# Histograms are per process; with several workers each reports its own.
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+MAX_RECORDED_QUERIES = 200
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Metrics:
+    def __init__(self):
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def render(self):
+        # Prometheus text exposition format.
+        with self._lock:
+            items = sorted(self._histograms.items())
+            lines, described = [], set()
+            for (name, labels), histogram in items:
+                if name not in described:
+                    described.add(name)
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} histogram")
+                label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in labels)
+                prefix = label_text + ',' if label_text else ''
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+                suffix = f"{{{label_text}}}" if label_text else ''
+                lines.append(f"{name}_sum{suffix} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{suffix} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.queries = []
+        self.timings = Counter()
+        self.render_started = []
+
+class Instrumentation:
+    def __init__(self, app=None, db=None):
+        self.app = None
+        self.metrics = Metrics()
+        self.metrics.describe('http_request_duration_seconds', 'Time to build the response, by endpoint.')
+        self.metrics.describe('http_request_sql_queries', 'SQL statements executed per request, by endpoint.')
+        self.metrics.describe('http_request_sql_duration_seconds', 'Time spent in SQL per request, by endpoint.')
+        self.metrics.describe('sql_query_duration_seconds', 'Duration of individual SQL statements.')
+        self.metrics.describe('template_render_duration_seconds', 'Time to render each template.')
+        self.metrics.describe('file_io_duration_seconds', 'Time spent on upload file I/O, by operation.')
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.app = app
+        app.config.setdefault('SLOW_REQUEST_MS', 500)
+        app.config.setdefault('SLOW_QUERY_MS', 100)
+        app.config.setdefault('SERVER_TIMING', True)
+        app.extensions['instrumentation'] = self
+
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self._metrics_view)
+
+    @staticmethod
+    def _stats():
+        if has_request_context():
+            return g.get('_instrumentation')
+        return None
+
+    def _start_request(self):
+        g._instrumentation = RequestStats()
+
+    # The start time lives on the execution context, which is discarded with
+    # the statement even when it raises; conn.info would outlive it on the
+    # pooled connection.
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._instrumentation_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_instrumentation_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        self.metrics.observe('sql_query_duration_seconds', elapsed)
+        stats = self._stats()
+        if stats is not None:
+            stats.sql_count += 1
+            stats.sql_time += elapsed
+            if len(stats.queries) < MAX_RECORDED_QUERIES:
+                stats.queries.append((elapsed, statement))
+        if elapsed * 1000 >= self.app.config['SLOW_QUERY_MS']:
+            self.app.logger.warning(f"Slow query ({elapsed * 1000:.1f}ms): {statement}")
+
+    def _before_render(self, sender, template, context, **extra):
+        stats = self._stats()
+        if stats is not None:
+            stats.render_started.append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        stats = self._stats()
+        if stats is None or not stats.render_started:
+            return
+        elapsed = time.perf_counter() - stats.render_started.pop()
+        stats.timings['tpl'] += elapsed
+        self.metrics.observe('template_render_duration_seconds', elapsed, template=template.name or 'string')
+
+    @contextmanager
+    def timed(self, name, operation=None):
+        # Adds the block's duration to this request's Server-Timing entry `name`.
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            stats = self._stats()
+            if stats is not None:
+                stats.timings[name] += elapsed
+            if operation:
+                self.metrics.observe('file_io_duration_seconds', elapsed, operation=operation)
+
+    def _finish_request(self, response):
+        stats = self._stats()
+        if stats is None:
+            return response
+        total = time.perf_counter() - stats.started
+        endpoint = request.endpoint or 'unmatched'
+        self.metrics.observe('http_request_duration_seconds', total, endpoint=endpoint)
+        self.metrics.observe('http_request_sql_queries', stats.sql_count, buckets=COUNT_BUCKETS, endpoint=endpoint)
+        self.metrics.observe('http_request_sql_duration_seconds', stats.sql_time, endpoint=endpoint)
+
+        if self.app.config['SERVER_TIMING']:
+            entries = [f'db;dur={stats.sql_time * 1000:.2f};desc="{stats.sql_count} queries"']
+            entries += [f"{name};dur={value * 1000:.2f}" for name, value in stats.timings.items()]
+            entries.append(f"total;dur={total * 1000:.2f}")
+            response.headers.add('Server-Timing', ', '.join(entries))
+
+        if total * 1000 >= self.app.config['SLOW_REQUEST_MS']:
+            self._log_slow_request(stats, total, response)
+        return response
+
+    def _log_slow_request(self, stats, total, response):
+        lines = [f"Slow request ({total * 1000:.1f}ms): {request.method} {request.full_path.rstrip('?')} "
+                 f"-> {response.status_code}, {stats.sql_count} queries in {stats.sql_time * 1000:.1f}ms"]
+        # The same statement run many times is the usual sign of an N+1 load.
+        statement, repeats = Counter(statement for _, statement in stats.queries).most_common(1)[0] \
+            if stats.queries else (None, 0)
+        if repeats > 1:
+            lines.append(f"  repeated {repeats}x: {statement}")
+        for elapsed, statement in sorted(stats.queries, reverse=True)[:3]:
+            lines.append(f"  {elapsed * 1000:.1f}ms: {statement}")
+        self.app.logger.warning('\n'.join(lines))
+
+    def _metrics_view(self):
+        # Only for scrapers on this machine; anything that came through a
+        # proxy (X-Forwarded-For) is refused even if the proxy is local.
+        if request.remote_addr not in ('127.0.0.1', '::1') or 'X-Forwarded-For' in request.headers:
+            abort(404)
+        return self.metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
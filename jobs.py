@@ -0,0 +1,161 @@
+import json
+import logging
+import threading
+import traceback
+from datetime import datetime, timedelta
+from models import db, Job
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+FAILURE_HANDLERS = {}
+
+def handler(kind):
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+def failure_handler(kind):
+    # Called with the job's payload once it has used up its attempts, so the
+    # rows it was working on can be moved out of their in-progress state.
+    def register(func):
+        FAILURE_HANDLERS[kind] = func
+        return func
+    return register
+
+def enqueue(kind, ref=None, max_attempts=3, **payload):
+    # The job is added to the caller's session so it commits (or rolls back)
+    # together with the rows it refers to.
+    job = Job(kind=kind, ref=ref, payload=json.dumps(payload), max_attempts=max_attempts)
+    db.session.add(job)
+    return job
+
+def latest_job(ref):
+    return Job.query.filter_by(ref=ref).order_by(Job.id.desc()).first()
+
+def requeue_stale(lock_timeout):
+    cutoff = datetime.utcnow() - timedelta(seconds=lock_timeout)
+    count = Job.query.filter(Job.status == 'running', Job.locked_at < cutoff).update(
+        {'status': 'queued', 'locked_at': None}, synchronize_session=False)
+    db.session.commit()
+    return count
+
+def claim_next():
+    now = datetime.utcnow()
+    candidates = db.session.query(Job.id).filter(Job.status == 'queued', Job.run_after <= now) \
+        .order_by(Job.run_after, Job.id).limit(5).all()
+    for (job_id,) in candidates:
+        # Conditional update so two workers (or two processes) never claim the same job.
+        claimed = Job.query.filter(Job.id == job_id, Job.status == 'queued').update(
+            {'status': 'running', 'locked_at': now, 'attempts': Job.attempts + 1}, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+    return None
+
+def run_job(job):
+    func = HANDLERS.get(job.kind)
+    try:
+        if func is None:
+            raise LookupError(f"No handler registered for job kind '{job.kind}'")
+        func(**json.loads(job.payload))
+        job.status = 'done'
+        job.last_error = None
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(Job, job.id)
+        job.last_error = f"{e.__class__.__name__}: {e}"
+        if job.attempts < job.max_attempts:
+            job.status = 'queued'
+            job.run_after = datetime.utcnow() + timedelta(seconds=5 * 2 ** job.attempts)
+            logger.warning(f"Job {job.id} ({job.kind}) failed, retrying: {job.last_error}")
+        else:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+            logger.error(f"Job {job.id} ({job.kind}) failed permanently:\n{traceback.format_exc()}")
+        job.locked_at = None
+        db.session.commit()
+        if job.status == 'failed':
+            run_failure_handler(job)
+        return False
+
+def run_failure_handler(job):
+    func = FAILURE_HANDLERS.get(job.kind)
+    if func is None:
+        return
+    try:
+        func(**json.loads(job.payload))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Failure handler for job {job.id} ({job.kind}) failed: {str(e)}")
+
+def run_pending(limit=None):
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+class WorkerPool:
+    def __init__(self, app=None):
+        self.app = None
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('JOB_WORKERS', 2)
+        app.config.setdefault('JOB_POLL_INTERVAL', 2.0)
+        app.config.setdefault('JOB_LOCK_TIMEOUT', 300)
+        app.extensions['job_pool'] = self
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self, size=None):
+        with self._lock:
+            if self.running:
+                return
+            self._stopping.clear()
+            size = self.app.config['JOB_WORKERS'] if size is None else size
+            with self.app.app_context():
+                requeue_stale(self.app.config['JOB_LOCK_TIMEOUT'])
+            self._threads = [threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                             for i in range(size)]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _work(self):
+        poll_interval = self.app.config['JOB_POLL_INTERVAL']
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    processed = run_pending(limit=10)
+            except Exception as e:
+                logger.error(f"Job worker error: {str(e)}")
+                processed = 0
+            if not processed:
+                self._wakeup.wait(poll_interval)
+                self._wakeup.clear()
@@ -1,19 +1,59 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.utils import secure_filename
 from sqlalchemy.exc import SQLAlchemyError
-from flask_migrate import Migrate
+from flask_migrate import Migrate, upgrade
+from concurrent.futures import ProcessPoolExecutor
+from collections import namedtuple, defaultdict
+import click
+import hashlib
 import os
-from datetime import datetime
-from models import db, Submission, Comment, Admin, Content
-from utils import allowed_file, get_coordinates_from_image
+import time
+from datetime import datetime, timedelta
+from models import db, Submission, Comment, Admin, Content, Blob, SiteStat, CacheVersion, content_cache, feed_version
+from cache import page_cache
+from utils import allowed_file, extract_coordinates
+from images import VARIANT_WIDTHS, has_variants, variant_name, variant_paths, backfill_variant, iter_original_photos
+from storage import stage_upload, store_staged, discard_staged, save_file
+from pagination import keyset_paginate
+from geo import covering_cells, radius_bbox, haversine_m, cluster_precision, geohash_encode
+from importer import ReportImporter
+from jobs import WorkerPool, enqueue, latest_job, run_pending, requeue_stale
+import search
+import moderation
+from instrumentation import Instrumentation
+from exports import csv_export, geojson_export
+from events import LiveUpdates
+from config import load_secret_key
+from assets import Assets, TAILWIND_NAME, used_classes, purge_css, static_sources, fetch, build
+import server
+import tasks
 
 app = Flask(__name__)
 app.config.from_object('config.Config')
+if not app.config['SECRET_KEY']:
+    app.config['SECRET_KEY'] = load_secret_key(app.instance_path)
 
 db.init_app(app)
-migrate = Migrate(app, db)
+with app.app_context():
+    _engines = list(db.engines.values())
+
+def reset_pools_after_fork():
+    # A forked worker must not reuse the parent's pooled connections; close=False
+    # leaves them open for the parent and only drops the child's references.
+    for engine in _engines:
+        engine.dispose(close=False)
+
+os.register_at_fork(after_in_child=reset_pools_after_fork)
+content_cache.check_interval = app.config['CONTENT_CACHE_CHECK_INTERVAL']
+content_cache.ttl = app.config['CONTENT_CACHE_TTL']
+feed_version.check_interval = app.config['FEED_VERSION_CHECK_INTERVAL']
+page_cache.maxsize = app.config['PAGE_CACHE_SIZE']
+migrate = Migrate(app, db, render_as_batch=True)
+instrumentation = Instrumentation(app, db)
+assets = Assets(app)
+
+job_pool = WorkerPool(app)
 
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -23,16 +63,93 @@ login_manager.login_view = 'login'
 def load_user(user_id):
     return Admin.query.get(int(user_id))
 
+PhotoSources = namedtuple('PhotoSources', ['src', 'webp', 'jpg'])
+_photos_with_variants = set()
+
+def photo_sources(photo):
+    if photo not in _photos_with_variants:
+        if not has_variants(photo, app.config['UPLOAD_FOLDER']):
+            return PhotoSources(url_for('static', filename='uploads/' + photo), None, None)
+        _photos_with_variants.add(photo)
+
+    def srcset(ext):
+        return ', '.join(f"{url_for('static', filename='uploads/' + variant_name(photo, width, ext))} {width}w"
+                         for width in VARIANT_WIDTHS)
+
+    src = url_for('static', filename='uploads/' + variant_name(photo, VARIANT_WIDTHS[1], 'jpg'))
+    return PhotoSources(src, srcset('webp'), srcset('jpg'))
+
+@app.before_request
+def start_job_workers():
+    if app.config['JOB_WORKERS'] and not job_pool.running:
+        job_pool.start()
+
+def wants_json():
+    return request.accept_mimetypes.best == 'application/json'
+
 @app.context_processor
 def inject_content():
-    return dict(Content=Content)
+    return dict(Content=Content, photo_sources=photo_sources)
+
+CachedPage = namedtuple('CachedPage', ['body', 'etag', 'last_modified', 'mimetype'])
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:32]
+
+def serve_cached(key, build):
+    # Anonymous GETs of public pages are answered from an LRU of rendered
+    # bodies keyed by the global change and content versions, and revalidated
+    # with strong ETags so unchanged pages cost a 304 and no queries at all.
+    # build() may return None for a missing resource, which is not cached.
+    if current_user.is_authenticated or session.get('_flashes'):
+        page = build()
+        return page and app.response_class(page.body, mimetype=page.mimetype)
+    version, _ = feed_version.get()
+    cache_key = (key, version, content_cache.version)
+    page = page_cache.get(cache_key)
+    if page is None:
+        page = build()
+        if page is None:
+            return None
+        page_cache.set(cache_key, page)
+    response = app.response_class(page.body, mimetype=page.mimetype)
+    response.set_etag(page.etag)
+    if page.last_modified:
+        response.last_modified = page.last_modified
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def feed_page(cursor):
+    return keyset_paginate(Submission.query.filter_by(status='active'),
+                           [Submission.created_at, Submission.id], per_page=6, cursor=cursor, sort_key='feed')
+
+def submission_json(submission):
+    photo = photo_sources(submission.photo)
+    return {
+        'id': submission.id,
+        'location': submission.location,
+        'created_at': submission.created_at.isoformat() if submission.created_at else None,
+        'comment_count': submission.comment_count,
+        'latitude': submission.latitude,
+        'longitude': submission.longitude,
+        'photo': {'src': photo.src, 'webp_srcset': photo.webp, 'jpg_srcset': photo.jpg,
+                  'original': url_for('static', filename='uploads/' + submission.photo)},
+        'url': url_for('submission_detail', id=submission.id),
+        'api_url': url_for('api_submission', id=submission.id)
+    }
 
 @app.route('/')
 def index():
     try:
-        page = request.args.get('page', 1, type=int)
-        submissions = Submission.query.filter_by(status='active').order_by(Submission.created_at.desc()).paginate(page=page, per_page=6, error_out=False)
-        return render_template('index.html', submissions=submissions.items if submissions else [], pagination=submissions)
+        cursor = request.args.get('cursor')
+
+        def build():
+            pagination = feed_page(cursor)
+            version, updated_at = feed_version.get()
+            html = render_template('index.html', submissions=pagination.items, pagination=pagination)
+            return CachedPage(html, make_etag('index', version, content_cache.version, cursor), updated_at, 'text/html')
+
+        return serve_cached(('index', cursor), build)
     except SQLAlchemyError as e:
         db.session.rollback()
         app.logger.error(f"Database error in index route: {str(e)}")
@@ -44,6 +161,49 @@ def index():
         flash("An error occurred while loading the page. Please try again.")
         return render_template('index.html', submissions=[], pagination=None), 500
 
+@app.route('/api/v1/submissions')
+def api_submissions():
+    try:
+        cursor = request.args.get('cursor')
+
+        def build():
+            pagination = feed_page(cursor)
+            version, updated_at = feed_version.get()
+            body = app.json.dumps({
+                'submissions': [submission_json(s) for s in pagination.items],
+                'next_cursor': pagination.next_cursor,
+                'prev_cursor': pagination.prev_cursor
+            })
+            return CachedPage(body, make_etag('api_submissions', version, cursor), updated_at, 'application/json')
+
+        return serve_cached(('api_submissions', cursor), build)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        app.logger.error(f"Database error in api_submissions: {str(e)}")
+        return jsonify({'error': 'An error occurred while loading reports.'}), 500
+
+@app.route('/api/v1/submissions/<int:id>')
+def api_submission(id):
+    try:
+        def build():
+            submission = Submission.query.filter_by(id=id, status='active').first()
+            if submission is None:
+                return None
+            comments = Comment.query.filter_by(submission_id=id).order_by(Comment.created_at.desc(), Comment.id.desc()).all()
+            data = submission_json(submission)
+            data['comments'] = [{'id': c.id, 'content': c.content, 'created_at': c.created_at.isoformat()} for c in comments]
+            return CachedPage(app.json.dumps(data), make_etag('api_submission', id, submission.version),
+                              submission.updated_at or submission.created_at, 'application/json')
+
+        response = serve_cached(('api_submission', id), build)
+        if response is None:
+            return jsonify({'error': 'Submission not found'}), 404
+        return response
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        app.logger.error(f"Database error in api_submission: {str(e)}")
+        return jsonify({'error': 'An error occurred while loading the report.'}), 500
+
 @app.route('/comment', methods=['POST'])
 def add_comment():
     try:
@@ -57,7 +217,7 @@ def add_comment():
         if not submission:
             return jsonify({'error': 'Submission not found'}), 404
         
-        new_comment = Comment(content=content, submission_id=submission_id)
+        new_comment = Comment(content=content, submission_id=submission.id)
         db.session.add(new_comment)
         db.session.commit()
         
@@ -124,8 +284,13 @@ def contact():
 @app.route('/submission/<int:id>')
 def submission_detail(id):
     try:
-        submission = Submission.query.get_or_404(id)
-        return render_template('detail.html', submission=submission)
+        def build():
+            submission = Submission.query.get_or_404(id)
+            html = render_template('detail.html', submission=submission)
+            return CachedPage(html, make_etag('detail', id, submission.version, content_cache.version),
+                              submission.updated_at or submission.created_at, 'text/html')
+
+        return serve_cached(('detail', id), build)
     except SQLAlchemyError as e:
         db.session.rollback()
         app.logger.error(f"Database error in submission_detail: {str(e)}")
@@ -140,41 +305,202 @@ def submission_detail(id):
 def submit_report():
     try:
         if 'photo' not in request.files:
-            flash('No file part')
-            return redirect(url_for('index'))
+            return submit_report_error('No file part', 400)
         
         photo = request.files['photo']
         location = request.form.get('location')
         
         if photo.filename == '':
-            flash('No selected file')
-            return redirect(url_for('index'))
+            return submit_report_error('No selected file', 400)
         
         if photo and allowed_file(photo.filename):
-            filename = secure_filename(photo.filename)
-            photo_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            photo.save(photo_path)
-            
-            coordinates = get_coordinates_from_image(photo_path)
+            upload_folder = app.config['UPLOAD_FOLDER']
+            with instrumentation.timed('file', operation='save_upload'):
+                tmp_path, sha256, photo_path, size = stage_upload(photo, upload_folder)
+            try:
+                # The file only moves into place once the blob row is locked,
+                # so a cleanup job deleting the same bytes cannot remove it.
+                blob, created = Blob.claim(sha256, photo_path, size)
+                store_staged(tmp_path, upload_folder, blob.path)
+            finally:
+                discard_staged(tmp_path)
+            duplicate = None
+            if not created:
+                duplicate = Submission.query.filter_by(blob_id=blob.id).order_by(Submission.id.desc()).first()
             
-            new_submission = Submission(photo=filename, location=location)
+            # EXIF parsing and image re-encoding run in the job queue; the row
+            # stays 'pending' (hidden from the public feed) until they finish.
+            new_submission = Submission(photo=blob.path, blob=blob, location=location, status='pending',
+                                        duplicate_of_id=duplicate.id if duplicate else None)
             db.session.add(new_submission)
+            db.session.flush()
+            enqueue('process_submission', ref=f"submission:{new_submission.id}", submission_id=new_submission.id)
             db.session.commit()
+            job_pool.wake()
             
+            if wants_json():
+                return jsonify({
+                    'success': True,
+                    'message': 'Your report has been submitted and is being processed.',
+                    'submission_id': new_submission.id,
+                    'status': new_submission.status,
+                    'duplicate_of': new_submission.duplicate_of_id,
+                    'status_url': url_for('submission_status', id=new_submission.id)
+                }), 202
             flash('Your report has been submitted successfully!')
             return redirect(url_for('index'))
         else:
-            flash('Invalid file type')
-            return redirect(url_for('index'))
+            return submit_report_error('Invalid file type', 400)
     except SQLAlchemyError as e:
         db.session.rollback()
         app.logger.error(f"Database error in submit_report: {str(e)}")
-        flash('An error occurred while submitting your report. Please try again.')
-        return redirect(url_for('index'))
+        return submit_report_error('An error occurred while submitting your report. Please try again.', 500)
     except Exception as e:
         app.logger.error(f"Error in submit_report: {str(e)}")
-        flash('An error occurred while submitting your report. Please try again.')
-        return redirect(url_for('index'))
+        return submit_report_error('An error occurred while submitting your report. Please try again.', 500)
+
+def submit_report_error(message, status_code):
+    if wants_json():
+        return jsonify({'error': message}), status_code
+    flash(message)
+    return redirect(url_for('index'))
+
+@app.route('/submission/<int:id>/status')
+def submission_status(id):
+    submission = Submission.query.get_or_404(id)
+    job = latest_job(f"submission:{id}")
+    hold_reason = None
+    if submission.status == 'on_hold':
+        hold_reason = 'processing_failed' if job and job.status == 'failed' else 'moderation'
+    return jsonify({
+        'id': submission.id,
+        'status': submission.status,
+        'hold_reason': hold_reason,
+        'processing': job.status if job else 'done',
+        'attempts': job.attempts if job else 0,
+        'duplicate_of': submission.duplicate_of_id,
+        'detail_url': url_for('submission_detail', id=submission.id)
+    })
+
+def render_live_event(item):
+    # Turns a committed change into the (event, data) sent to every /events
+    # client; runs once per process per change, not once per client.
+    kind = item['type']
+    if kind == 'submission':
+        submission = db.session.get(Submission, item['id'])
+        if submission is None or submission.status != 'active':
+            return 'removed', {'id': item['id']}
+        return 'submission', {'id': submission.id, 'created_at': submission.created_at.isoformat(),
+                              'comment_count': submission.comment_count,
+                              'html': render_template('_submission_card.html', submission=submission)}
+    if kind == 'comment':
+        comment = db.session.get(Comment, item['id'])
+        if comment is None:
+            return None
+        return 'comment', {'id': comment.id, 'submission_id': comment.submission_id,
+                           'comment_count': comment.submission.comment_count,
+                           'html': render_template('_comment.html', comment=comment)}
+    if kind == 'comment_removed':
+        submission = db.session.get(Submission, item['submission_id'])
+        return 'comment_removed', {'id': item['id'], 'submission_id': item['submission_id'],
+                                   'comment_count': submission.comment_count if submission else 0}
+    if kind == 'removed':
+        return 'removed', {'id': item['id']}
+    return 'reset', {}
+
+live_updates = LiveUpdates(app, render=render_live_event)
+
+@app.route('/events')
+def live_events():
+    # No stream_with_context: the stream must not hold an app context or a
+    # database connection for as long as the client stays connected.
+    if live_updates.full:
+        return jsonify({'error': 'Too many live connections, try again later.'}), 503, {'Retry-After': '30'}
+    return Response(live_updates.stream(request.headers.get('Last-Event-ID')), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+MAX_NEAR_RADIUS_M = 50000
+MAX_API_POINTS = 1000
+POINTS_MIN_ZOOM = 15
+
+def map_point(row, **extra):
+    point = {
+        'id': row.id,
+        'latitude': row.latitude,
+        'longitude': row.longitude,
+        'location': row.location,
+        'url': url_for('submission_detail', id=row.id),
+        'thumbnail': photo_sources(row.photo).src
+    }
+    point.update(extra)
+    return point
+
+def map_point_query():
+    return db.session.query(Submission.id, Submission.latitude, Submission.longitude,
+                            Submission.location, Submission.photo).filter(Submission.status == 'active')
+
+@app.route('/api/submissions/near')
+def submissions_near():
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    radius = request.args.get('radius', 1000, type=float)
+    limit = max(1, min(request.args.get('limit', 100, type=int), MAX_API_POINTS))
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return jsonify({'error': 'lat and lon are required and must be valid coordinates'}), 400
+    if not 0 < radius <= MAX_NEAR_RADIUS_M:
+        return jsonify({'error': f'radius must be between 0 and {MAX_NEAR_RADIUS_M} meters'}), 400
+    try:
+        south, west, north, east = radius_bbox(lat, lon, radius)
+        rows = map_point_query().filter(Submission.in_cells(covering_cells(south, west, north, east))).all()
+        nearby = sorted((haversine_m(lat, lon, row.latitude, row.longitude), row) for row in rows)
+        results = [map_point(row, distance_m=round(distance, 1)) for distance, row in nearby if distance <= radius]
+        return jsonify({'submissions': results[:limit], 'count': len(results)})
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        app.logger.error(f"Database error in submissions_near: {str(e)}")
+        return jsonify({'error': 'An error occurred while searching nearby reports.'}), 500
+
+@app.route('/api/submissions/bbox')
+def submissions_bbox():
+    south = request.args.get('south', type=float)
+    west = request.args.get('west', type=float)
+    north = request.args.get('north', type=float)
+    east = request.args.get('east', type=float)
+    zoom = request.args.get('zoom', 10, type=int)
+    if None in (south, west, north, east) or not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        return jsonify({'error': 'south, west, north and east must describe a valid bounding box'}), 400
+    try:
+        query = map_point_query().filter(
+            Submission.in_cells(covering_cells(south, west, north, east)),
+            Submission.latitude.between(south, north),
+            Submission.longitude.between(west, east)
+        )
+        if zoom >= POINTS_MIN_ZOOM:
+            rows = query.limit(MAX_API_POINTS).all()
+            return jsonify({'zoom': zoom, 'points': [map_point(row) for row in rows], 'clusters': []})
+
+        # Aggregate in the database: one row per geohash cell sized for this zoom level.
+        precision = cluster_precision(zoom)
+        cell = db.func.substr(Submission.geohash, 1, precision)
+        rows = query.with_entities(
+            cell.label('cell'),
+            db.func.count(Submission.id).label('count'),
+            db.func.avg(Submission.latitude).label('latitude'),
+            db.func.avg(Submission.longitude).label('longitude'),
+            db.func.min(Submission.id).label('id')
+        ).group_by(cell).all()
+        clusters = [{
+            'geohash': row.cell,
+            'count': row.count,
+            'latitude': row.latitude,
+            'longitude': row.longitude,
+            'url': url_for('submission_detail', id=row.id) if row.count == 1 else None
+        } for row in rows]
+        return jsonify({'zoom': zoom, 'precision': precision, 'points': [], 'clusters': clusters})
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        app.logger.error(f"Database error in submissions_bbox: {str(e)}")
+        return jsonify({'error': 'An error occurred while loading map reports.'}), 500
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -193,34 +519,38 @@ def login():
             flash('Invalid username or password')
     return render_template('login.html')
 
+MODERATOR_SORT_COLUMNS = {
+    'created_at': Submission.created_at,
+    'location': Submission.location,
+    'comments': Submission.comment_count,
+}
+
 @app.route('/moderator')
 @login_required
 def moderator():
     try:
-        page = request.args.get('page', 1, type=int)
+        cursor = request.args.get('cursor')
         status_filter = request.args.get('status', 'all')
         sort_by = request.args.get('sort_by', 'created_at')
         sort_order = request.args.get('sort_order', 'desc')
+        if sort_by not in MODERATOR_SORT_COLUMNS:
+            sort_by = 'created_at'
 
         query = Submission.query
 
         if status_filter != 'all':
             query = query.filter_by(status=status_filter)
 
-        if sort_by == 'created_at':
-            query = query.order_by(Submission.created_at.desc() if sort_order == 'desc' else Submission.created_at.asc())
-        elif sort_by == 'location':
-            query = query.order_by(Submission.location.desc() if sort_order == 'desc' else Submission.location.asc())
-        elif sort_by == 'comments':
-            query = query.outerjoin(Comment).group_by(Submission.id).order_by(db.func.count(Comment.id).desc() if sort_order == 'desc' else db.func.count(Comment.id).asc())
-
-        pagination = query.paginate(page=page, per_page=10, error_out=False)
+        pagination = keyset_paginate(query, [MODERATOR_SORT_COLUMNS[sort_by], Submission.id], per_page=10,
+                                     descending=sort_order == 'desc', cursor=cursor,
+                                     sort_key=f"{sort_by}.{sort_order}")
         submissions = pagination.items
 
-        total_submissions = Submission.query.count()
-        active_submissions = Submission.query.filter_by(status='active').count()
-        on_hold_submissions = Submission.query.filter_by(status='on_hold').count()
-        total_comments = Comment.query.count()
+        stats = SiteStat.totals()
+        total_submissions = stats.get('submissions', 0)
+        active_submissions = stats.get('submissions_active', 0)
+        on_hold_submissions = stats.get('submissions_on_hold', 0)
+        total_comments = stats.get('comments', 0)
 
         return render_template('moderator.html', 
                                submissions=submissions, 
@@ -242,6 +572,24 @@ def moderator():
         flash("An error occurred while loading the moderator dashboard. Please try again.")
         return redirect(url_for('index'))
 
+@app.route('/moderator/search')
+@login_required
+def moderator_search():
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    try:
+        results, has_next = search.search(db.session.connection(), query, page=page) if query else ([], False)
+        submission_ids = {result['submission_id'] for result in results}
+        submissions = {s.id: s for s in Submission.query.filter(Submission.id.in_(submission_ids))} if submission_ids else {}
+        results = [dict(result, submission=submissions[result['submission_id']])
+                   for result in results if result['submission_id'] in submissions]
+        return render_template('moderator_search.html', query=query, results=results, page=page, has_next=has_next)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        app.logger.error(f"Database error in moderator_search: {str(e)}")
+        flash("An error occurred while searching. Please try again.")
+        return redirect(url_for('moderator'))
+
 @app.route('/moderator/submission/<int:id>')
 @login_required
 def moderator_submission_detail(id):
@@ -281,9 +629,11 @@ def change_status(id, status):
 @login_required
 def delete_submission(id):
     try:
-        submission = Submission.query.get_or_404(id)
-        db.session.delete(submission)
+        if not moderation.delete(moderation.selection(ids=[id])):
+            flash(f'Submission {id} not found')
+            return redirect(url_for('moderator'))
         db.session.commit()
+        job_pool.wake()
         flash(f'Submission {id} has been deleted')
         return redirect(url_for('moderator'))
     except SQLAlchemyError as e:
@@ -296,6 +646,111 @@ def delete_submission(id):
         flash("An error occurred while deleting the submission. Please try again.")
         return redirect(url_for('moderator'))
 
+BULK_ACTIONS = {'active': 'activated', 'on_hold': 'put on hold', 'pending': 'set to pending', 'delete': 'deleted'}
+
+def parse_date_arg(value, end=False):
+    # 'YYYY-MM-DD' (whole day, inclusive at both ends) or a full ISO timestamp.
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+@app.route('/moderator/bulk', methods=['POST'])
+@login_required
+def bulk_moderate():
+    # Accepts the dashboard form or a JSON body:
+    #   {"action": "on_hold" | "active" | "pending" | "delete",
+    #    "ids": [1, 2, 3]}                                        explicit ids, or
+    #   {"action": ..., "filter": {"status": ..., "created_from": ..., "created_to": ...,
+    #                              "duplicates_only": true}}      everything matching
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {'action': request.form.get('action'), 'ids': request.form.getlist('ids')}
+        if request.form.get('scope') == 'filter':
+            status = request.form.get('status', 'all')
+            data['filter'] = {'status': None if status == 'all' else status}
+    action = data.get('action')
+    try:
+        if action not in BULK_ACTIONS:
+            raise ValueError(f"Unknown action: {action}")
+        if data.get('filter') is not None:
+            filters = data['filter']
+            if action == 'delete' and not any(filters.get(key) for key in
+                                               ('status', 'created_from', 'created_to', 'duplicates_only')):
+                raise ValueError('Choose a status, date range or duplicates filter before deleting every match')
+            query = moderation.selection(status=filters.get('status'),
+                                         created_from=parse_date_arg(filters.get('created_from')),
+                                         created_to=parse_date_arg(filters.get('created_to'), end=True),
+                                         duplicates_only=bool(filters.get('duplicates_only')))
+        else:
+            ids = [int(id) for id in data.get('ids') or []]
+            if not ids:
+                raise ValueError('No submissions selected')
+            query = moderation.selection(ids=ids)
+    except (TypeError, ValueError) as e:
+        if wants_json() or request.is_json:
+            return jsonify({'error': str(e)}), 400
+        flash(str(e))
+        return redirect(url_for('moderator'))
+
+    try:
+        if action == 'delete':
+            count = moderation.delete(query)
+        else:
+            count = moderation.set_status(query, action)
+        db.session.commit()
+        job_pool.wake()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        app.logger.error(f"Database error in bulk_moderate: {str(e)}")
+        if wants_json() or request.is_json:
+            return jsonify({'error': 'An error occurred while updating submissions.'}), 500
+        flash("An error occurred while updating submissions. Please try again.")
+        return redirect(url_for('moderator'))
+
+    if wants_json() or request.is_json:
+        return jsonify({'action': action, 'count': count})
+    flash(f"{count} submission{'s' if count != 1 else ''} {BULK_ACTIONS[action]}")
+    return redirect(url_for('moderator', status=request.form.get('status', 'all')))
+
+def parse_bbox(value):
+    if not value:
+        return None
+    south, west, north, east = (float(part) for part in value.split(','))
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        raise ValueError('bbox must be south,west,north,east')
+    return south, west, north, east
+
+def export_filters(args):
+    status = args.get('status', 'all')
+    return moderation.submission_filters(status=None if status == 'all' else status,
+                                         created_from=parse_date_arg(args.get('from')),
+                                         created_to=parse_date_arg(args.get('to'), end=True),
+                                         bbox=parse_bbox(args.get('bbox')))
+
+def export_response(export, mimetype, filename, args):
+    try:
+        conditions = export_filters(args)
+    except ValueError as e:
+        return jsonify({'error': f"Invalid export filter: {str(e)}"}), 400
+    stream = export(conditions, lambda photo: url_for('static', filename='uploads/' + photo, _external=True))
+    return Response(stream_with_context(stream), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@app.route('/moderator/export.csv')
+@login_required
+def export_csv():
+    # ?status=&from=YYYY-MM-DD&to=YYYY-MM-DD&bbox=south,west,north,east
+    return export_response(csv_export, 'text/csv', 'road-damage-reports.csv', request.args)
+
+@app.route('/export.geojson')
+def export_geojson():
+    # Public, so only active reports unless a moderator is logged in.
+    args = request.args if current_user.is_authenticated else dict(request.args, status='active')
+    return export_response(geojson_export, 'application/geo+json', 'road-damage-reports.geojson', args)
+
 @app.route('/logout')
 @login_required
 def logout():
@@ -383,8 +838,217 @@ def delete_admin_user(id):
         flash('You cannot delete your own account', 'error')
     return redirect(url_for('admin_users'))
 
+@app.cli.command('backfill-variants')
+@click.option('--workers', default=os.cpu_count(), type=int, help='Number of worker processes.')
+@click.option('--force', is_flag=True, help='Regenerate variants that already exist.')
+def backfill_variants(workers, force):
+    upload_folder = app.config['UPLOAD_FOLDER']
+    photos = [photo for photo in iter_original_photos(upload_folder) if allowed_file(photo)]
+    started = time.monotonic()
+    generated = failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        jobs = ((photo, upload_folder, force) for photo in photos)
+        for photo, written, error in executor.map(backfill_variant, jobs, chunksize=8):
+            if error:
+                failed += 1
+                click.echo(f"Failed to generate variants for {photo}: {error}", err=True)
+            elif written:
+                generated += 1
+    elapsed = time.monotonic() - started
+    click.echo(f"Processed {len(photos)} photos in {elapsed:.1f}s: {generated} generated, "
+               f"{len(photos) - generated - failed} up to date, {failed} failed")
+
+def write_coordinates(updates):
+    # One executemany UPDATE per batch. It bypasses the ORM hooks, so the row
+    # and feed versions that key the page cache and ETags are bumped here.
+    table = Submission.__table__
+    db.session.execute(table.update().where(table.c.id == db.bindparam('row_id'))
+                       .values(latitude=db.bindparam('latitude'), longitude=db.bindparam('longitude'),
+                               geohash=db.bindparam('geohash'), version=table.c.version + 1,
+                               updated_at=datetime.utcnow()), updates)
+    CacheVersion.bump('feed')
+    db.session.info['feed_changed'] = True
+    db.session.commit()
+
+@app.cli.command('extract-coordinates')
+@click.option('--workers', default=os.cpu_count(), type=int, help='Number of worker processes.')
+@click.option('--missing-only', is_flag=True, help='Skip submissions that already have coordinates.')
+@click.option('--batch-size', default=1000, type=int, help='Rows updated per transaction.')
+def extract_coordinates_command(workers, missing_only, batch_size):
+    upload_folder = app.config['UPLOAD_FOLDER']
+    query = db.session.query(Submission.id, Submission.photo)
+    if missing_only:
+        query = query.filter(Submission.latitude.is_(None))
+    # Content-addressed photos can back several submissions; parse each file once.
+    ids_by_photo = defaultdict(list)
+    for submission_id, photo in query.yield_per(10000):
+        ids_by_photo[photo].append(submission_id)
+    db.session.rollback()
+
+    started = time.monotonic()
+    found = missing = 0
+    updates = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        jobs = ((photo, os.path.join(upload_folder, photo)) for photo in ids_by_photo)
+        for photo, coordinates in executor.map(extract_coordinates, jobs, chunksize=64):
+            if not coordinates:
+                missing += 1
+                continue
+            found += 1
+            lat, lon = coordinates['latitude'], coordinates['longitude']
+            updates.extend({'row_id': submission_id, 'latitude': lat, 'longitude': lon, 'geohash': geohash_encode(lat, lon)}
+                           for submission_id in ids_by_photo[photo])
+            if len(updates) >= batch_size:
+                write_coordinates(updates)
+                updates = []
+    if updates:
+        write_coordinates(updates)
+    elapsed = time.monotonic() - started
+    total = found + missing
+    click.echo(f"Scanned {total} photos in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} photos/s): "
+               f"{found} with GPS data, {missing} without")
+
+@app.cli.command('import-reports')
+@click.argument('manifest', type=click.Path(exists=True, dir_okay=False))
+@click.option('--photos', 'photo_root', required=True, type=click.Path(exists=True, file_okay=False),
+              help='Directory that manifest photo paths are relative to.')
+@click.option('--link', is_flag=True, help='Hard-link photos into the upload folder instead of copying.')
+@click.option('--workers', default=8, type=int, help='Parallel photo copy/hash threads.')
+@click.option('--batch-size', default=2000, type=int, help='Submissions inserted per transaction.')
+@click.option('--checkpoint', type=click.Path(dir_okay=False), default=None,
+              help='Progress file; rerunning with the same file resumes after the last committed batch.')
+def import_reports(manifest, photo_root, link, workers, batch_size, checkpoint):
+    importer = ReportImporter(app.config['UPLOAD_FOLDER'], photo_root, link=link, workers=workers, batch_size=batch_size)
+    started = time.monotonic()
+
+    def report(records, imported, skipped):
+        elapsed = time.monotonic() - started
+        click.echo(f"{records} records processed, {imported} imported, {skipped} skipped "
+                   f"({imported / elapsed if elapsed else 0:.0f} reports/s)")
+
+    imported, skipped = importer.run(manifest, checkpoint=checkpoint or f"{manifest}.checkpoint", on_batch=report)
+    click.echo(f"Imported {imported} reports ({skipped} skipped) in {time.monotonic() - started:.1f}s; "
+               f"run 'flask run-worker' to process them")
+
+@app.cli.command('export-reports')
+@click.argument('output', type=click.File('w', encoding='utf-8'))
+@click.option('--format', 'export_format', type=click.Choice(['csv', 'geojson']), default='csv')
+@click.option('--status', default='all')
+@click.option('--from', 'created_from', default=None, help='YYYY-MM-DD or ISO timestamp.')
+@click.option('--to', 'created_to', default=None, help='YYYY-MM-DD (inclusive) or ISO timestamp.')
+@click.option('--bbox', default=None, help='south,west,north,east')
+@click.option('--base-url', default='', help='Prefix for photo URLs, e.g. https://example.org')
+def export_reports(output, export_format, status, created_from, created_to, bbox, base_url):
+    # OUTPUT may be '-' for stdout.
+    try:
+        conditions = export_filters({'status': status, 'from': created_from, 'to': created_to, 'bbox': bbox})
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    export = csv_export if export_format == 'csv' else geojson_export
+    for chunk in export(conditions, lambda photo: f"{base_url.rstrip('/')}/static/uploads/{photo}"):
+        output.write(chunk)
+
+@app.cli.command('reconcile-stats')
+def reconcile_stats():
+    totals = SiteStat.reconcile()
+    db.session.commit()
+    for name, value in sorted(totals.items()):
+        click.echo(f"{name}: {value}")
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index():
+    started = time.monotonic()
+    connection = db.session.connection()
+    search.create_index(connection)
+    search.rebuild(connection)
+    db.session.commit()
+    click.echo(f"Rebuilt the search index in {time.monotonic() - started:.1f}s")
+
+@app.cli.command('migrate-uploads')
+def migrate_uploads():
+    upload_folder = app.config['UPLOAD_FOLDER']
+    legacy_photos = [photo for (photo,) in db.session.query(Submission.photo).filter(Submission.blob_id.is_(None)).distinct()]
+    migrated = missing = 0
+    for photo in legacy_photos:
+        legacy_path = os.path.join(upload_folder, photo)
+        if not os.path.isfile(legacy_path):
+            missing += 1
+            click.echo(f"Missing file for {photo}, leaving its submissions unchanged", err=True)
+            continue
+        sha256, photo_path, size = save_file(legacy_path, upload_folder)
+        blob, created = Blob.get_or_create(sha256, photo_path, size)
+        submissions = Submission.query.filter_by(photo=photo, blob_id=None).all()
+        for submission in submissions:
+            submission.photo = blob.path
+            submission.blob = blob
+            enqueue('process_submission', ref=f"submission:{submission.id}", submission_id=submission.id)
+        db.session.commit()
+        for _, _, variant_path in variant_paths(photo, upload_folder):
+            if os.path.exists(variant_path):
+                os.remove(variant_path)
+        os.remove(legacy_path)
+        migrated += 1
+    click.echo(f"Moved {migrated} files into content-addressed storage ({missing} missing); "
+               f"run 'flask run-worker --once' to compute variants and perceptual hashes")
+
+@app.cli.command('run-worker')
+@click.option('--workers', default=None, type=int, help='Number of worker threads (defaults to JOB_WORKERS).')
+@click.option('--once', is_flag=True, help='Process the jobs that are due and exit.')
+def run_worker(workers, once):
+    if once:
+        requeue_stale(app.config['JOB_LOCK_TIMEOUT'])
+        click.echo(f"Processed {run_pending()} jobs")
+        return
+    size = workers or app.config['JOB_WORKERS'] or 1
+    job_pool.start(size=size)
+    click.echo(f"Job workers running ({size} threads); press Ctrl+C to stop")
+    try:
+        while job_pool.running:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        job_pool.stop(timeout=30)
+
+@app.cli.command('build-assets')
+@click.option('--tailwind', 'tailwind_path', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Full Tailwind stylesheet to purge (downloaded once from TAILWIND_CSS_URL otherwise).')
+@click.option('--safelist', multiple=True, help='Keep this class even though no template mentions it (repeatable).')
+def build_assets(tailwind_path, safelist):
+    if tailwind_path:
+        with open(tailwind_path, encoding='utf-8') as f:
+            tailwind = f.read()
+    else:
+        tailwind = fetch(app.config['TAILWIND_CSS_URL'], app.instance_path)
+    used = used_classes([os.path.join(app.root_path, 'templates', '**', '*.html'),
+                         os.path.join(app.static_folder, 'js', '**', '*.js')]) | set(safelist)
+    purged = purge_css(tailwind, used)
+    exclude = {os.path.abspath(os.path.join(app.root_path, app.config['UPLOAD_FOLDER'])),
+               os.path.abspath(app.config['ASSETS_FOLDER'])}
+    sources = static_sources(app.static_folder, exclude)
+    sources[TAILWIND_NAME] = purged.encode()
+    manifest = build(sources, app.config['ASSETS_FOLDER'])
+    click.echo(f"Purged Tailwind from {len(tailwind) // 1024} KB to {len(purged) // 1024} KB")
+    click.echo(f"Wrote {len(manifest)} assets to {app.config['ASSETS_FOLDER']}; restart the server to use them")
+
+@app.cli.command('init-db')
+def init_db():
+    # Schema changes run once, here, and never in the serving processes.
+    upgrade()
+    click.echo("Database is up to date")
+
+@app.cli.command('serve')
+@click.option('--host', default='0.0.0.0', show_default=True)
+@click.option('--port', default=lambda: int(os.environ.get('PORT', 5000)), type=int, help='Defaults to $PORT or 5000.')
+@click.option('--workers', default=None, type=int, help='Worker processes (defaults to WEB_WORKERS).')
+@click.option('--max-requests', default=None, type=int, help='Replace a worker after this many requests (defaults to WEB_MAX_REQUESTS).')
+def serve(host, port, workers, max_requests):
+    workers = workers or app.config['WEB_WORKERS']
+    click.echo(f"Serving on http://{host}:{port} with {workers} workers")
+    server.serve(app, host, port, workers,
+                 max_requests=app.config['WEB_MAX_REQUESTS'] if max_requests is None else max_requests,
+                 max_requests_jitter=app.config['WEB_MAX_REQUESTS_JITTER'],
+                 graceful_timeout=app.config['WEB_GRACEFUL_TIMEOUT'])
+
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
+    # Development server; run 'flask init-db' first, and 'flask serve' in production.
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,47 @@
+"""Add full-text search index
+
+Revision ID: 7c2e9a4d51f3
+Revises: 1ab504aa546a
+Create Date: 2026-10-18 13:42:10.214871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e9a4d51f3'
+down_revision = '1ab504aa546a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Hand-written: the index is an FTS5 virtual table on SQLite and a
+    # tsvector column with a GIN index on Postgres (see search.py).
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE search_index USING fts5("
+                   "body, submission_id UNINDEXED, tokenize = 'porter unicode61')")
+        op.execute("INSERT INTO search_index (rowid, body, submission_id) "
+                   "SELECT id * 2, location, id FROM submission")
+        op.execute("INSERT INTO search_index (rowid, body, submission_id) "
+                   "SELECT id * 2 + 1, content, submission_id FROM comment")
+    elif dialect == 'postgresql':
+        op.execute("CREATE TABLE search_document ("
+                   "doc_id BIGINT PRIMARY KEY, submission_id INTEGER NOT NULL, body TEXT NOT NULL, "
+                   "tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', body)) STORED)")
+        op.execute("INSERT INTO search_document (doc_id, submission_id, body) "
+                   "SELECT id * 2, id, location FROM submission")
+        op.execute("INSERT INTO search_document (doc_id, submission_id, body) "
+                   "SELECT id * 2 + 1, submission_id, content FROM comment")
+        op.execute("CREATE INDEX ix_search_document_tsv ON search_document USING GIN (tsv)")
+        op.execute("CREATE INDEX ix_search_document_submission_id ON search_document (submission_id)")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS search_index")
+    elif dialect == 'postgresql':
+        op.execute("DROP TABLE IF EXISTS search_document")
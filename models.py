@@ -1,7 +1,19 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import random
+import threading
+import time
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.attributes import get_history
+from storage import phash_bands, to_signed64, hamming_distance
+from geo import geohash_encode, prefix_range
+from cache import VersionMemo, page_cache
+from search import index_submission, index_comment, remove_submissions, remove_comments
 
 db = SQLAlchemy()
 
@@ -16,13 +28,126 @@ class Admin(db.Model, UserMixin):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+class Blob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    path = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    phash = db.Column(db.BigInteger)
+    # The 64-bit perceptual hash split into four indexed 16-bit bands. Two hashes
+    # within Hamming distance 3 must share at least one band exactly, so near
+    # duplicates are found with indexed equality lookups instead of a scan.
+    phash_0 = db.Column(db.Integer, index=True)
+    phash_1 = db.Column(db.Integer, index=True)
+    phash_2 = db.Column(db.Integer, index=True)
+    phash_3 = db.Column(db.Integer, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @classmethod
+    def get_or_create(cls, sha256, path, size):
+        blob = cls.query.filter_by(sha256=sha256).first()
+        if blob:
+            return blob, False
+        try:
+            with db.session.begin_nested():
+                blob = cls(sha256=sha256, path=path, size=size)
+                db.session.add(blob)
+            return blob, True
+        except IntegrityError:
+            # A concurrent upload of the same bytes won the insert.
+            return cls.query.filter_by(sha256=sha256).one(), False
+
+    @classmethod
+    def claim(cls, sha256, path, size):
+        # get_or_create that also locks an existing row until the transaction
+        # ends (an UPDATE takes the write lock on SQLite as well), so a
+        # delete_blob job either finishes first, and the row is created
+        # afresh, or waits and then sees the new reference.
+        db.session.execute(db.update(cls).where(cls.sha256 == sha256).values(size=cls.size)
+                           .execution_options(synchronize_session=False))
+        return cls.get_or_create(sha256, path, size)
+
+    @classmethod
+    def get_or_create_many(cls, files):
+        # files: {sha256: (path, size)}. Returns {sha256: blob_id} and the set of
+        # hashes that were already stored before this call.
+        ids = {}
+        hashes = list(files)
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            ids.update(db.session.query(cls.sha256, cls.id).filter(cls.sha256.in_(chunk)).all())
+        existing = set(ids)
+        missing = [{'sha256': sha256, 'path': path, 'size': size}
+                   for sha256, (path, size) in files.items() if sha256 not in ids]
+        if missing:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(db.insert(cls), missing)
+            except IntegrityError:
+                pass
+            for i in range(0, len(missing), 500):
+                chunk = [row['sha256'] for row in missing[i:i + 500]]
+                ids.update(db.session.query(cls.sha256, cls.id).filter(cls.sha256.in_(chunk)).all())
+            for row in missing:
+                if row['sha256'] not in ids:
+                    blob, _ = cls.get_or_create(row['sha256'], row['path'], row['size'])
+                    ids[row['sha256']] = blob.id
+        return ids, existing
+
+    def set_phash(self, value):
+        self.phash = to_signed64(value)
+        self.phash_0, self.phash_1, self.phash_2, self.phash_3 = phash_bands(value)
+
+    def find_similar(self, max_distance=3):
+        if self.phash is None:
+            return []
+        candidates = Blob.query.filter(
+            Blob.id != self.id,
+            db.or_(Blob.phash_0 == self.phash_0, Blob.phash_1 == self.phash_1,
+                   Blob.phash_2 == self.phash_2, Blob.phash_3 == self.phash_3)
+        ).all()
+        return [blob for blob in candidates if hamming_distance(blob.phash, self.phash) <= max_distance]
+
 class Submission(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     photo = db.Column(db.String(255), nullable=False)
+    blob_id = db.Column(db.Integer, db.ForeignKey('blob.id'), index=True)
+    blob = db.relationship('Blob')
+    duplicate_of_id = db.Column(db.Integer, db.ForeignKey('submission.id', ondelete='SET NULL'))
     location = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     comments = db.relationship('Comment', backref='submission', lazy=True, cascade='all, delete-orphan')
+    # Denormalized len(comments), maintained by the Comment insert/delete hooks
+    # below so listings can show and sort by it without loading comments.
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     status = db.Column(db.String(20), default='active')
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12))
+    # Bumped on every change to the row or its comments; part of the ETag.
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # One index per listing order, with and without the status filter, each
+    # ending in id so keyset pagination can seek straight to a cursor.
+    __table_args__ = (
+        db.Index('ix_submission_created_at_id', 'created_at', 'id'),
+        db.Index('ix_submission_status_created_at_id', 'status', 'created_at', 'id'),
+        db.Index('ix_submission_location_id', 'location', 'id'),
+        db.Index('ix_submission_status_location_id', 'status', 'location', 'id'),
+        db.Index('ix_submission_comment_count_id', 'comment_count', 'id'),
+        db.Index('ix_submission_status_comment_count_id', 'status', 'comment_count', 'id'),
+        db.Index('ix_submission_status_geohash', 'status', 'geohash'),
+    )
+
+    def set_coordinates(self, latitude, longitude):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.geohash = geohash_encode(latitude, longitude)
+
+    @classmethod
+    def in_cells(cls, cells):
+        return db.or_(*[cls.geohash.between(*prefix_range(cell)) for cell in cells])
 
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -30,6 +155,194 @@ class Comment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), nullable=False)
 
+    __table_args__ = (db.Index('ix_comment_submission_id_created_at', 'submission_id', 'created_at'),)
+
+UPSERT_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+def upsert(connection, table):
+    # An INSERT that takes .on_conflict_do_update(): creating a missing row and
+    # bumping an existing one is a single statement, so two transactions that
+    # both find the row missing cannot collide on its primary key.
+    try:
+        return UPSERT_DIALECTS[connection.dialect.name](table)
+    except KeyError:
+        raise ValueError(f"Upserts are not supported on {connection.dialect.name}") from None
+
+class SiteStat(db.Model):
+    # Running totals for the moderator dashboard. Each counter is spread over
+    # STAT_SLOTS rows so concurrent writers rarely wait on the same row lock;
+    # the total is the sum of its slots.
+    name = db.Column(db.String(50), primary_key=True)
+    slot = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+    @classmethod
+    def totals(cls):
+        return {name: int(total) for name, total in
+                db.session.query(cls.name, db.func.sum(cls.value)).group_by(cls.name)}
+
+    @classmethod
+    def apply(cls, connection, deltas):
+        table = cls.__table__
+        for name, delta in deltas.items():
+            if not delta:
+                continue
+            slot = random.randrange(STAT_SLOTS)
+            connection.execute(upsert(connection, table).values(name=name, slot=slot, value=delta)
+                               .on_conflict_do_update(index_elements=[table.c.name, table.c.slot],
+                                                      set_={'value': table.c.value + delta}))
+
+    @classmethod
+    def reconcile(cls):
+        connection = db.session.connection()
+        if connection.dialect.name == 'postgresql':
+            # Block counter updates until the recount commits; writers that
+            # committed earlier are included in the counts below.
+            connection.execute(db.text('LOCK TABLE site_stat IN EXCLUSIVE MODE'))
+        connection.execute(cls.__table__.delete())
+        totals = {'submissions': 0, 'comments': Comment.query.count()}
+        totals.update({f'submissions_{status}': 0 for status in SUBMISSION_STATUSES})
+        for status, count in db.session.query(Submission.status, db.func.count(Submission.id)).group_by(Submission.status):
+            totals['submissions'] += count
+            totals[f'submissions_{status}'] = count
+        # Pre-create every slot so writers find an existing row to update.
+        connection.execute(cls.__table__.insert(), [{'name': name, 'slot': slot, 'value': value if slot == 0 else 0}
+                                                    for name, value in totals.items()
+                                                    for slot in range(STAT_SLOTS)])
+        return totals
+
+STAT_SLOTS = 8
+SUBMISSION_STATUSES = ('pending', 'active', 'on_hold')
+
+def _touch_submission(connection, submission_id, **values):
+    table = Submission.__table__
+    connection.execute(
+        table.update()
+        .where(table.c.id == submission_id)
+        .values(version=table.c.version + 1, updated_at=datetime.utcnow(), **values)
+    )
+
+def _adjust_comment_count(connection, submission_id, delta):
+    _touch_submission(connection, submission_id, comment_count=Submission.__table__.c.comment_count + delta)
+    SiteStat.apply(connection, {'comments': delta})
+
+@event.listens_for(Comment, 'after_insert')
+def increment_comment_count(mapper, connection, comment):
+    _adjust_comment_count(connection, comment.submission_id, 1)
+    index_comment(connection, comment.id, comment.submission_id, comment.content)
+
+@event.listens_for(Comment, 'after_delete')
+def decrement_comment_count(mapper, connection, comment):
+    _adjust_comment_count(connection, comment.submission_id, -1)
+    remove_comments(connection, [comment.id])
+
+@event.listens_for(Comment, 'after_update')
+def touch_commented_submission(mapper, connection, comment):
+    _touch_submission(connection, comment.submission_id)
+    if get_history(comment, 'content').has_changes():
+        index_comment(connection, comment.id, comment.submission_id, comment.content)
+
+@event.listens_for(Submission, 'before_update')
+def bump_submission_version(mapper, connection, submission):
+    if object_session(submission).is_modified(submission, include_collections=False):
+        submission.version = Submission.version + 1
+        submission.updated_at = datetime.utcnow()
+
+@event.listens_for(Submission, 'after_insert')
+def count_new_submission(mapper, connection, submission):
+    SiteStat.apply(connection, {'submissions': 1, f'submissions_{submission.status}': 1})
+    index_submission(connection, submission.id, submission.location)
+
+@event.listens_for(Submission, 'after_delete')
+def count_deleted_submission(mapper, connection, submission):
+    SiteStat.apply(connection, {'submissions': -1, f'submissions_{submission.status}': -1})
+    remove_submissions(connection, [submission.id])
+
+@event.listens_for(Submission, 'after_update')
+def count_status_change(mapper, connection, submission):
+    history = get_history(submission, 'status')
+    if history.deleted and history.added and history.deleted[0] != history.added[0]:
+        SiteStat.apply(connection, {f'submissions_{history.deleted[0]}': -1,
+                                    f'submissions_{history.added[0]}': 1})
+    if get_history(submission, 'location').has_changes():
+        index_submission(connection, submission.id, submission.location)
+
+class CacheVersion(db.Model):
+    key = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime)
+
+    @classmethod
+    def get(cls, key):
+        return db.session.query(cls.version).filter_by(key=key).scalar() or 0
+
+    @classmethod
+    def get_stamp(cls, key):
+        row = db.session.query(cls.version, cls.updated_at).filter_by(key=key).first()
+        return (row.version, row.updated_at) if row else (0, None)
+
+    @classmethod
+    def bump(cls, key):
+        cls.bump_on(db.session.connection(), key)
+
+    @classmethod
+    def bump_on(cls, connection, key):
+        table = cls.__table__
+        now = datetime.utcnow()
+        connection.execute(upsert(connection, table).values(key=key, version=1, updated_at=now)
+                           .on_conflict_do_update(index_elements=[table.c.key],
+                                                  set_={'version': table.c.version + 1, 'updated_at': now}))
+
+# Global version of everything the public pages show; see the flush hook below.
+feed_version = VersionMemo(lambda: CacheVersion.get_stamp('feed'))
+
+class ContentCache:
+    # Every Content row, loaded in one query and shared by all requests in the
+    # process. Writers bump the 'content' CacheVersion row in the same
+    # transaction; readers re-check that version at most every check_interval
+    # seconds, and reload unconditionally after ttl seconds as a fallback.
+    def __init__(self, check_interval=5.0, ttl=300.0):
+        self.check_interval = check_interval
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.invalidate()
+
+    def invalidate(self):
+        self._values = None
+        self._version = None
+        self._loaded_at = self._checked_at = 0.0
+
+    @property
+    def version(self):
+        self.values()
+        return self._version
+
+    def values(self):
+        now = time.monotonic()
+        values = self._values
+        if values is not None and now - self._checked_at < self.check_interval and now - self._loaded_at < self.ttl:
+            return values
+        with self._lock:
+            now = time.monotonic()
+            if self._values is None or now - self._loaded_at >= self.ttl:
+                self._reload(now)
+            elif now - self._checked_at >= self.check_interval:
+                if CacheVersion.get('content') != self._version:
+                    self._reload(now)
+                else:
+                    self._checked_at = now
+            return self._values
+
+    def _reload(self, now):
+        # Read the version first: a write racing with the reload then just
+        # causes one extra reload on the next check.
+        version = CacheVersion.get('content')
+        self._values = dict(db.session.query(Content.key, Content.value).all())
+        self._version = version
+        self._loaded_at = self._checked_at = now
+
+content_cache = ContentCache()
+
 class Content(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     key = db.Column(db.String(50), unique=True, nullable=False)
@@ -37,8 +350,7 @@ class Content(db.Model):
 
     @classmethod
     def get_value(cls, key, default=''):
-        content = cls.query.filter_by(key=key).first()
-        return content.value if content else default
+        return content_cache.values().get(key, default)
 
     @classmethod
     def set_value(cls, key, value):
@@ -48,3 +360,45 @@ class Content(db.Model):
         else:
             content = cls(key=key, value=value)
             db.session.add(content)
+        CacheVersion.bump('content')
+        db.session.info['content_changed'] = True
+
+@event.listens_for(Session, 'after_flush')
+def bump_feed_version(session, flush_context):
+    if session.info.get('feed_changed'):
+        return
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Submission, Comment)):
+            CacheVersion.bump_on(session.connection(), 'feed')
+            session.info['feed_changed'] = True
+            return
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_content_cache(session):
+    if session.info.pop('content_changed', False):
+        content_cache.invalidate()
+        page_cache.clear()
+    if session.info.pop('feed_changed', False):
+        feed_version.invalidate()
+        page_cache.clear()
+
+@event.listens_for(Session, 'after_rollback')
+def discard_content_changes(session):
+    session.info.pop('content_changed', None)
+    session.info.pop('feed_changed', None)
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    ref = db.Column(db.String(100), index=True)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.Index('ix_job_status_run_after', 'status', 'run_after'),)
@@ -0,0 +1,148 @@
+from datetime import datetime
+from flask import current_app
+from models import db, Submission, Comment, Blob, SiteStat, CacheVersion, SUBMISSION_STATUSES
+from jobs import handler, enqueue
+from images import delete_photo_files
+from search import remove_submissions, remove_comments
+from geo import covering_cells
+import events
+
+# Bulk moderation runs as set-based UPDATE/DELETE statements, which skip the
+# mapper hooks in models.py, so everything those hooks maintain (counters,
+# versions, search index, feed version, live updates) is updated here by hand.
+
+CHUNK_SIZE = 500
+
+def _chunks(ids):
+    for i in range(0, len(ids), CHUNK_SIZE):
+        yield ids[i:i + CHUNK_SIZE]
+
+def submission_filters(status=None, created_from=None, created_to=None, duplicates_only=False, bbox=None):
+    # The dashboard filters as SQL conditions; bbox is (south, west, north, east).
+    conditions = []
+    if status:
+        conditions.append(Submission.status == status)
+    if created_from:
+        conditions.append(Submission.created_at >= created_from)
+    if created_to:
+        conditions.append(Submission.created_at < created_to)
+    if duplicates_only:
+        conditions.append(Submission.duplicate_of_id.isnot(None))
+    if bbox:
+        south, west, north, east = bbox
+        conditions += [Submission.in_cells(covering_cells(south, west, north, east)),
+                       Submission.latitude.between(south, north), Submission.longitude.between(west, east)]
+    return conditions
+
+def selection(ids=None, **filters):
+    # Explicit ids, or every submission matching the dashboard filters.
+    query = db.select(Submission.id).where(*submission_filters(**filters))
+    if ids is not None:
+        query = query.where(Submission.id.in_(ids))
+    return query
+
+def _lock_rows(query, *columns):
+    # Lock the selected rows up front (a no-op on SQLite, which locks the whole
+    # database on the first write) so the counter deltas below match what the
+    # UPDATE/DELETE actually changes.
+    return db.session.execute(query.with_only_columns(Submission.id, *columns)
+                              .order_by(Submission.id).with_for_update()).all()
+
+def _mark_feed_changed(connection):
+    CacheVersion.bump_on(connection, 'feed')
+    db.session.info['feed_changed'] = True
+
+def set_status(query, status):
+    if status not in SUBMISSION_STATUSES:
+        raise ValueError(f"Unknown status: {status}")
+    rows = [row for row in _lock_rows(query, Submission.status) if row.status != status]
+    if not rows:
+        return 0
+    connection = db.session.connection()
+    table = Submission.__table__
+    now = datetime.utcnow()
+    for chunk in _chunks([row.id for row in rows]):
+        connection.execute(table.update().where(table.c.id.in_(chunk))
+                           .values(status=status, version=table.c.version + 1, updated_at=now))
+    deltas = {f'submissions_{status}': len(rows)}
+    for row in rows:
+        key = f'submissions_{row.status}'
+        deltas[key] = deltas.get(key, 0) - 1
+    SiteStat.apply(connection, deltas)
+    _mark_feed_changed(connection)
+    events.publish([{'type': 'submission' if status == 'active' else 'removed', 'id': row.id}
+                    for row in rows if 'active' in (status, row.status)])
+    return len(rows)
+
+def delete(query):
+    rows = _lock_rows(query, Submission.status, Submission.blob_id, Submission.photo)
+    if not rows:
+        return 0
+    connection = db.session.connection()
+    submissions, comments = Submission.__table__, Comment.__table__
+    ids = [row.id for row in rows]
+    comment_count = 0
+    for chunk in _chunks(ids):
+        comment_ids = [comment_id for (comment_id,) in
+                       connection.execute(db.select(comments.c.id).where(comments.c.submission_id.in_(chunk)))]
+        if comment_ids:
+            connection.execute(comments.delete().where(comments.c.submission_id.in_(chunk)))
+            remove_comments(connection, comment_ids)
+            comment_count += len(comment_ids)
+        # ON DELETE SET NULL is not enforced by SQLite, so clear the back references here.
+        connection.execute(submissions.update()
+                           .where(submissions.c.duplicate_of_id.in_(chunk), submissions.c.id.notin_(chunk))
+                           .values(duplicate_of_id=None, version=submissions.c.version + 1,
+                                   updated_at=datetime.utcnow()))
+        connection.execute(submissions.delete().where(submissions.c.id.in_(chunk)))
+        remove_submissions(connection, chunk)
+
+    deltas = {'submissions': -len(rows), 'comments': -comment_count}
+    for row in rows:
+        key = f'submissions_{row.status}'
+        deltas[key] = deltas.get(key, 0) - 1
+    SiteStat.apply(connection, deltas)
+    _mark_feed_changed(connection)
+    events.publish([{'type': 'removed', 'id': submission_id} for submission_id in ids])
+
+    # Files are removed by a job committed in this same transaction: either the
+    # rows and the cleanup job both exist, or neither does.
+    blob_ids = {row.blob_id for row in rows if row.blob_id is not None}
+    still_used = set()
+    for chunk in _chunks(list(blob_ids)):
+        still_used.update(blob_id for (blob_id,) in connection.execute(
+            db.select(submissions.c.blob_id).where(submissions.c.blob_id.in_(chunk)).distinct()))
+    for blob_id in sorted(blob_ids - still_used):
+        enqueue('delete_blob', ref=f"blob:{blob_id}", max_attempts=5, blob_id=blob_id)
+    for photo in sorted({row.photo for row in rows if row.blob_id is None}):
+        enqueue('delete_blob', ref=f"photo:{photo}", max_attempts=5, photo=photo)
+    return len(rows)
+
+def _photo_in_use(photo, blob_id):
+    submissions, blobs = Submission.query.filter(Submission.photo == photo), Blob.query.filter(Blob.path == photo)
+    if blob_id is not None:
+        submissions = Submission.query.filter(db.or_(Submission.photo == photo, Submission.blob_id == blob_id))
+        blobs = blobs.filter(Blob.id != blob_id)
+    return submissions.first() is not None or blobs.first() is not None
+
+@handler('delete_blob')
+def delete_blob(blob_id=None, photo=None):
+    # Idempotent, so a retry after a crash finishes whatever is left.
+    # References are checked while the blob row is locked, so an upload that
+    # claimed these bytes (Blob.claim) has committed and is seen, and one that
+    # comes later waits until the files are gone. SQLite has no row locks;
+    # there the DELETE takes the write lock and the check is repeated after it.
+    if blob_id is not None:
+        blob = db.session.get(Blob, blob_id, with_for_update=True)
+        if blob is None or _photo_in_use(blob.path, blob_id):
+            return
+        photo = blob.path
+        db.session.delete(blob)
+        db.session.flush()
+    if _photo_in_use(photo, blob_id):
+        db.session.rollback()
+        return
+    # The row is only gone once the files are: if removal fails the
+    # transaction rolls back and the job is retried.
+    delete_photo_files(photo, current_app.config['UPLOAD_FOLDER'])
+    db.session.commit()
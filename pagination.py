@@ -0,0 +1,90 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from sqlalchemy import tuple_
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return ['dt', value.isoformat()]
+    return ['v', value]
+
+def _decode_value(pair):
+    kind, value = pair
+    if kind == 'dt':
+        return datetime.fromisoformat(value)
+    if kind == 'v':
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise ValueError(f"Invalid cursor value: {value!r}")
+        return value
+    raise ValueError(f"Unknown cursor value type: {kind}")
+
+def encode_cursor(sort_key, direction, values):
+    payload = json.dumps({'s': sort_key, 'd': direction, 'k': [_encode_value(v) for v in values]},
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token, sort_key, size):
+    # Cursors come from the query string; anything that is not exactly one
+    # scalar per sort column is rejected rather than handed to the database.
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload['s'] != sort_key or payload['d'] not in ('next', 'prev'):
+            raise ValueError('Cursor does not match this listing')
+        if not isinstance(payload['k'], list) or len(payload['k']) != size:
+            raise ValueError('Cursor has the wrong number of values')
+        return payload['d'], [_decode_value(pair) for pair in payload['k']]
+    except (binascii.Error, KeyError, TypeError, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+def keyset_paginate(query, columns, per_page, descending=True, cursor=None, sort_key='default'):
+    # Seek pagination over a unique ordering such as (created_at, id): each
+    # page is an index range scan starting after the previous page's last
+    # row, so page 1000 costs the same as page 1 and no COUNT(*) is needed.
+    direction, values = 'next', None
+    if cursor:
+        try:
+            direction, values = decode_cursor(cursor, sort_key, len(columns))
+        except ValueError:
+            direction, values = 'next', None
+
+    # Walking backwards flips the comparison and order; rows are reversed afterwards.
+    backwards = direction == 'prev'
+    scan_descending = descending != backwards
+    key = tuple_(*columns)
+    if values is not None:
+        bound = tuple_(*values)
+        query = query.filter(key < bound if scan_descending else key > bound)
+    query = query.order_by(*[c.desc() if scan_descending else c.asc() for c in columns])
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def row_key(row):
+        return [getattr(row, c.key) for c in columns]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or backwards:
+            next_cursor = encode_cursor(sort_key, 'next', row_key(rows[-1]))
+        if (has_more and backwards) or (values is not None and not backwards):
+            prev_cursor = encode_cursor(sort_key, 'prev', row_key(rows[0]))
+    return KeysetPage(rows, next_cursor, prev_cursor)
@@ -0,0 +1,156 @@
+import re
+from markupsafe import Markup, escape
+from sqlalchemy import text
+
+# One full-text index over submission locations and comment bodies. SQLite
+# uses an FTS5 virtual table and Postgres a tsvector column with a GIN index;
+# callers only see the functions at the bottom of this module.
+#
+# Documents are keyed by doc_id = ref_id * 2 + kind so every update or delete
+# is a primary-key operation on both backends.
+
+KIND_SUBMISSION = 0
+KIND_COMMENT = 1
+KIND_NAMES = {KIND_SUBMISSION: 'submission', KIND_COMMENT: 'comment'}
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+def doc_id(kind, ref_id):
+    return ref_id * 2 + kind
+
+class SQLiteBackend:
+    create_statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "body, submission_id UNINDEXED, tokenize = 'porter unicode61')",
+    ]
+    drop_statements = ["DROP TABLE IF EXISTS search_index"]
+
+    def upsert(self, connection, kind, ref_id, submission_id, body):
+        # FTS5 columns have no type affinity, so a string id would be stored
+        # (and returned) as text.
+        rowid = doc_id(kind, ref_id)
+        connection.execute(text("DELETE FROM search_index WHERE rowid = :rowid"), {'rowid': rowid})
+        connection.execute(text("INSERT INTO search_index (rowid, body, submission_id) VALUES (:rowid, :body, :submission_id)"),
+                           {'rowid': rowid, 'body': body, 'submission_id': int(submission_id)})
+
+    def delete(self, connection, kind, ref_ids):
+        for ref_id in ref_ids:
+            connection.execute(text("DELETE FROM search_index WHERE rowid = :rowid"), {'rowid': doc_id(kind, ref_id)})
+
+    def query(self, connection, terms, limit, offset):
+        match = ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms) + '*'
+        return connection.execute(text(
+            "SELECT rowid AS doc_id, submission_id, "
+            "snippet(search_index, 0, :start, :end, '…', 16) AS snippet, bm25(search_index) AS rank "
+            "FROM search_index WHERE search_index MATCH :match ORDER BY rank LIMIT :limit OFFSET :offset"
+        ), {'match': match, 'start': HIGHLIGHT_START, 'end': HIGHLIGHT_END, 'limit': limit, 'offset': offset}).all()
+
+    def rebuild_statements(self):
+        return [
+            "DELETE FROM search_index",
+            "INSERT INTO search_index (rowid, body, submission_id) SELECT id * 2, location, id FROM submission",
+            "INSERT INTO search_index (rowid, body, submission_id) SELECT id * 2 + 1, content, submission_id FROM comment",
+        ]
+
+class PostgresBackend:
+    create_statements = [
+        "CREATE TABLE IF NOT EXISTS search_document ("
+        "doc_id BIGINT PRIMARY KEY, submission_id INTEGER NOT NULL, body TEXT NOT NULL, "
+        "tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', body)) STORED)",
+        "CREATE INDEX IF NOT EXISTS ix_search_document_tsv ON search_document USING GIN (tsv)",
+        "CREATE INDEX IF NOT EXISTS ix_search_document_submission_id ON search_document (submission_id)",
+    ]
+    drop_statements = ["DROP TABLE IF EXISTS search_document"]
+
+    def upsert(self, connection, kind, ref_id, submission_id, body):
+        connection.execute(text(
+            "INSERT INTO search_document (doc_id, submission_id, body) VALUES (:doc_id, :submission_id, :body) "
+            "ON CONFLICT (doc_id) DO UPDATE SET body = EXCLUDED.body, submission_id = EXCLUDED.submission_id"
+        ), {'doc_id': doc_id(kind, ref_id), 'submission_id': submission_id, 'body': body})
+
+    def delete(self, connection, kind, ref_ids):
+        ids = [doc_id(kind, ref_id) for ref_id in ref_ids]
+        if ids:
+            connection.execute(text("DELETE FROM search_document WHERE doc_id = ANY(:ids)"), {'ids': ids})
+
+    def query(self, connection, terms, limit, offset):
+        # Rank and page on the GIN index first, then build headlines for just this page.
+        return connection.execute(text(
+            "SELECT hits.doc_id, hits.submission_id, hits.rank, "
+            "ts_headline('english', d.body, hits.q, :options) AS snippet "
+            "FROM (SELECT doc_id, submission_id, q, ts_rank_cd(tsv, q) AS rank "
+            "      FROM search_document, to_tsquery('english', :query) AS q "
+            "      WHERE tsv @@ q ORDER BY rank DESC, doc_id DESC LIMIT :limit OFFSET :offset) AS hits "
+            "JOIN search_document d ON d.doc_id = hits.doc_id ORDER BY hits.rank DESC, hits.doc_id DESC"
+        ), {'query': ' & '.join(terms) + ':*', 'limit': limit, 'offset': offset,
+            'options': f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords=24, MinWords=8'}).all()
+
+    def rebuild_statements(self):
+        return [
+            "DELETE FROM search_document",
+            "INSERT INTO search_document (doc_id, submission_id, body) SELECT id * 2, id, location FROM submission",
+            "INSERT INTO search_document (doc_id, submission_id, body) "
+            "SELECT id * 2 + 1, submission_id, content FROM comment",
+        ]
+
+BACKENDS = {'sqlite': SQLiteBackend(), 'postgresql': PostgresBackend()}
+
+def backend_for(connection):
+    return BACKENDS.get(connection.dialect.name)
+
+def index_submission(connection, submission_id, location):
+    backend = backend_for(connection)
+    if backend:
+        backend.upsert(connection, KIND_SUBMISSION, submission_id, submission_id, location)
+
+def index_comment(connection, comment_id, submission_id, content):
+    backend = backend_for(connection)
+    if backend:
+        backend.upsert(connection, KIND_COMMENT, comment_id, int(submission_id), content)
+
+def remove_submissions(connection, submission_ids):
+    backend = backend_for(connection)
+    if backend:
+        backend.delete(connection, KIND_SUBMISSION, submission_ids)
+
+def remove_comments(connection, comment_ids):
+    backend = backend_for(connection)
+    if backend:
+        backend.delete(connection, KIND_COMMENT, comment_ids)
+
+def create_index(connection):
+    # For databases whose tables were not created by the migrations (which
+    # create the index themselves); idempotent.
+    backend = backend_for(connection)
+    if backend:
+        for statement in backend.create_statements:
+            connection.execute(text(statement))
+
+def rebuild(connection):
+    backend = backend_for(connection)
+    if backend is None:
+        raise ValueError(f"Full-text search is not supported on {connection.dialect.name}")
+    for statement in backend.rebuild_statements():
+        connection.execute(text(statement))
+
+def highlight(snippet):
+    escaped = str(escape(snippet or ''))
+    return Markup(escaped.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>'))
+
+def search_terms(query):
+    return re.findall(r'\w+', query.lower())[:16]
+
+def search(connection, query, page=1, per_page=20):
+    backend = backend_for(connection)
+    terms = search_terms(query)
+    if backend is None or not terms:
+        return [], False
+    rows = backend.query(connection, terms, per_page + 1, (page - 1) * per_page)
+    results = [{
+        'kind': KIND_NAMES[row.doc_id % 2],
+        'ref_id': row.doc_id // 2,
+        'submission_id': int(row.submission_id),
+        'snippet': highlight(row.snippet),
+        'rank': row.rank
+    } for row in rows[:per_page]]
+    return results, len(rows) > per_page
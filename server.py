@@ -0,0 +1,155 @@
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from werkzeug.serving import make_server
+from werkzeug.wsgi import ClosingIterator
+
+logger = logging.getLogger(__name__)
+
+# A small pre-forking server. The master loads the app and binds the socket
+# once, then forks worker processes that all accept on it, each serving
+# requests on threads. A worker that has served max_requests stops accepting,
+# finishes what is in flight and exits, and the master starts a replacement;
+# the other workers keep accepting meanwhile, so nothing is refused.
+#
+#   SIGTERM / SIGINT  stop the workers gracefully, then exit
+#   SIGHUP            start a fresh set of workers, then retire the old ones
+
+class _Lifetime:
+    # Counts requests (streamed responses stay active until closed) and asks
+    # the worker to stop once it has served its share.
+    def __init__(self, app, max_requests, on_exhausted):
+        self.app = app
+        self.max_requests = max_requests
+        self.on_exhausted = on_exhausted
+        self.served = 0
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.served += 1
+            self.active += 1
+            exhausted = self.served == self.max_requests
+        if exhausted:
+            self.on_exhausted()
+        try:
+            return ClosingIterator(self.app(environ, start_response), self._finished)
+        except BaseException:
+            self._finished()
+            raise
+
+    def _finished(self):
+        with self._lock:
+            self.active -= 1
+
+def _run_worker(app, sock, max_requests, graceful_timeout):
+    host, port = sock.getsockname()[:2]
+    stopping = threading.Event()
+    server = None
+
+    def stop(*args):
+        # shutdown() blocks until serve_forever returns, so never call it
+        # from the thread that is running serve_forever.
+        if not stopping.is_set():
+            stopping.set()
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+    lifetime = _Lifetime(app, max_requests, stop)
+    server = make_server(host, port, lifetime, threaded=True, fd=sock.fileno())
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    try:
+        server.serve_forever()
+    finally:
+        deadline = time.monotonic() + graceful_timeout
+        while lifetime.active and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if lifetime.active:
+            logger.warning(f"Worker {os.getpid()} exiting with {lifetime.active} requests still open")
+        server.server_close()
+
+def serve(app, host, port, workers, max_requests=0, max_requests_jitter=0, graceful_timeout=30):
+    sock = socket.create_server((host, port), backlog=2048)
+    children = set()
+    signals = []
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(signum, lambda signum, frame: signals.append(signum))
+
+    def spawn():
+        # Jitter keeps the workers from all restarting at the same moment.
+        limit = max_requests + random.randint(0, max_requests_jitter) if max_requests else 0
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                _run_worker(app, sock, limit, graceful_timeout)
+            except BaseException as e:
+                logger.exception(f"Worker {os.getpid()} failed: {str(e)}")
+                status = 1
+            finally:
+                logging.shutdown()
+                os._exit(status)
+        children.add(pid)
+
+    def stop(pids, timeout):
+        for pid in pids:
+            _kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + timeout
+        while pids & children and time.monotonic() < deadline:
+            reap()
+            time.sleep(0.1)
+        for pid in pids & children:
+            _kill(pid, signal.SIGKILL)
+
+    def reap():
+        while children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                children.clear()
+                return
+            if pid == 0:
+                return
+            children.discard(pid)
+            if os.waitstatus_to_exitcode(status) != 0:
+                logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}")
+
+    logger.info(f"Listening on http://{host}:{port} with {workers} workers")
+    try:
+        for _ in range(workers):
+            spawn()
+        while True:
+            time.sleep(0.2)
+            if signals:
+                signum = signals.pop(0)
+                if signum != signal.SIGHUP:
+                    break
+                logger.info("Reloading workers")
+                old = set(children)
+                for _ in range(workers):
+                    spawn()
+                stop(old, graceful_timeout + 5)
+            reap()
+            missing = workers - len(children)
+            if missing > 0:
+                for _ in range(missing):
+                    spawn()
+                # Workers that die straight away (a crash on startup) are not
+                # restarted in a tight loop.
+                time.sleep(1)
+    finally:
+        logger.info("Shutting down")
+        stop(set(children), graceful_timeout + 5)
+        sock.close()
+
+def _kill(pid, signum):
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
@@ -1,6 +1,7 @@
 document.addEventListener('DOMContentLoaded', function() {
     const submissionForm = document.getElementById('submission-form');
     const commentForm = document.getElementById('comment-form');
+    const bulkSelectAll = document.getElementById('bulk-select-all');
     
     if (submissionForm) {
         submissionForm.addEventListener('submit', handleSubmission);
@@ -9,24 +10,113 @@ document.addEventListener('DOMContentLoaded', function() {
     if (commentForm) {
         commentForm.addEventListener('submit', handleComment);
     }
+
+    if (bulkSelectAll) {
+        bulkSelectAll.addEventListener('change', function() {
+            document.querySelectorAll('.bulk-select').forEach(checkbox => {
+                checkbox.checked = bulkSelectAll.checked;
+            });
+        });
+    }
+
+    listenForUpdates();
 });
 
+const FEED_PAGE_SIZE = 6;
+// Reports this page has received a live 'submission' event for.
+const liveSubmissionIds = new Set();
+
+function listenForUpdates() {
+    // Patch the feed and comment list in place as changes are committed.
+    const feed = document.querySelector('[data-live-feed]');
+    const commentsContainer = document.getElementById('comments-container');
+    if ((!feed && !commentsContainer) || !window.EventSource) {
+        return;
+    }
+    const source = new EventSource('/events');
+    const on = (name, handler) => source.addEventListener(name, event => handler(JSON.parse(event.data)));
+
+    on('submission', data => {
+        liveSubmissionIds.add(data.id);
+        if (!feed) {
+            return;
+        }
+        const existing = feed.querySelector(`[data-submission-id="${data.id}"]`);
+        const card = fragment(data.html);
+        if (existing) {
+            existing.replaceWith(card);
+            return;
+        }
+        // Keep newest first; a report older than the whole page belongs on a later one.
+        const after = Array.from(feed.children).find(el => el.dataset.createdAt < data.created_at);
+        if (!after && feed.children.length >= FEED_PAGE_SIZE) {
+            return;
+        }
+        feed.insertBefore(card, after || null);
+        while (feed.children.length > FEED_PAGE_SIZE) {
+            feed.lastElementChild.remove();
+        }
+    });
+    on('removed', data => {
+        const card = feed && feed.querySelector(`[data-submission-id="${data.id}"]`);
+        if (card) {
+            card.remove();
+        }
+    });
+    on('comment', data => {
+        updateCommentCount(feed, data);
+        if (isCommentList(commentsContainer, data) && !commentsContainer.querySelector(`[data-comment-id="${data.id}"]`)) {
+            commentsContainer.insertBefore(fragment(data.html), commentsContainer.firstChild);
+        }
+    });
+    on('comment_removed', data => {
+        updateCommentCount(feed, data);
+        const comment = isCommentList(commentsContainer, data) && commentsContainer.querySelector(`[data-comment-id="${data.id}"]`);
+        if (comment) {
+            comment.remove();
+        }
+    });
+    // Too many changes at once, or events were missed while disconnected.
+    on('reset', () => location.reload());
+}
+
+function fragment(html) {
+    const template = document.createElement('template');
+    template.innerHTML = html.trim();
+    return template.content.firstElementChild;
+}
+
+function isCommentList(commentsContainer, data) {
+    return commentsContainer && commentsContainer.dataset.submissionId === String(data.submission_id);
+}
+
+function updateCommentCount(feed, data) {
+    const count = feed && feed.querySelector(`[data-submission-id="${data.submission_id}"] [data-comment-count]`);
+    if (count) {
+        count.textContent = data.comment_count;
+    }
+}
+
 async function handleSubmission(event) {
     event.preventDefault();
-    const formData = new FormData(event.target);
+    const form = event.target;
+    const formData = new FormData(form);
     const loadingPopup = document.querySelector('.loading-popup');
     
     try {
         loadingPopup.style.display = 'flex';
         const response = await fetch('/submit_report', {
             method: 'POST',
+            headers: { 'Accept': 'application/json' },
             body: formData
         });
+        loadingPopup.style.display = 'none';
         
         if (response.ok) {
             const result = await response.json();
-            alert('Submission successful!');
-            location.reload(); // Reload the page to show the new submission
+            form.reset();
+            showSubmissionStatus(form, 'Upload complete. Processing your photo...');
+            pollSubmissionStatus(form, result.status_url);
         } else {
             const error = await response.json();
             alert(`Error: ${error.error}`);
@@ -39,6 +129,55 @@ async function handleSubmission(event) {
     }
 }
 
+function showSubmissionStatus(form, message) {
+    let status = form.querySelector('.submission-status');
+    if (!status) {
+        status = document.createElement('p');
+        status.className = 'submission-status text-gray-600 mt-4';
+        form.appendChild(status);
+    }
+    status.textContent = message;
+}
+
+async function pollSubmissionStatus(form, statusUrl, attempt = 0) {
+    try {
+        const response = await fetch(statusUrl, { headers: { 'Accept': 'application/json' } });
+        if (response.ok) {
+            const result = await response.json();
+            if (result.hold_reason === 'processing_failed') {
+                showSubmissionStatus(form, 'Your report was received but the photo could not be processed. A moderator will review it.');
+                return;
+            }
+            if (result.status !== 'pending') {
+                showSubmissionStatus(form, 'Submission successful!');
+                if (result.status === 'active') {
+                    showWhenNotLive(result.id);
+                }
+                return;
+            }
+        }
+    } catch (error) {
+        console.error('Error:', error);
+    }
+    if (attempt < 60) {
+        setTimeout(() => pollSubmissionStatus(form, statusUrl, attempt + 1), Math.min(1000 * (attempt + 1), 5000));
+    } else {
+        showSubmissionStatus(form, 'Your report was received and will appear once processing finishes.');
+    }
+}
+
+function showWhenNotLive(submissionId) {
+    // Events only reach clients of the process that committed the change
+    // unless there is a cross-process backend (Postgres), and the job that
+    // activated this report may have run in another worker. Reload unless
+    // the live feed has shown it by now.
+    setTimeout(() => {
+        if (!liveSubmissionIds.has(submissionId)) {
+            location.reload();
+        }
+    }, window.EventSource ? 2000 : 0);
+}
+
 async function handleComment(event) {
     event.preventDefault();
     const formData = new FormData(event.target);
@@ -51,7 +190,7 @@ async function handleComment(event) {
         
         if (response.ok) {
             const result = await response.json();
-            addCommentToDOM(result.comment.content, result.comment.created_at);
+            addCommentToDOM(result.comment);
             event.target.reset();
         } else {
             const error = await response.json();
@@ -63,13 +202,19 @@ async function handleComment(event) {
     }
 }
 
-function addCommentToDOM(content, timestamp) {
+function addCommentToDOM(comment) {
     const commentsContainer = document.getElementById('comments-container');
+    if (commentsContainer.querySelector(`[data-comment-id="${comment.id}"]`)) {
+        return; // already added by a live update
+    }
     const commentElement = document.createElement('div');
     commentElement.className = 'bg-gray-100 p-3 rounded mb-2';
-    commentElement.innerHTML = `
-        <p>${content}</p>
-        <p class="text-sm text-gray-500">${timestamp}</p>
-    `;
+    commentElement.dataset.commentId = comment.id;
+    const content = document.createElement('p');
+    content.textContent = comment.content;
+    const timestamp = document.createElement('p');
+    timestamp.className = 'text-sm text-gray-500';
+    timestamp.textContent = comment.created_at;
+    commentElement.append(content, timestamp);
     commentsContainer.insertBefore(commentElement, commentsContainer.firstChild);
 }
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import tempfile
+from PIL import Image
+
+CHUNK_SIZE = 64 * 1024
+INCOMING_DIR = '.incoming'
+PHASH_BANDS = 4
+PHASH_BAND_BITS = 64 // PHASH_BANDS
+
+def blob_path(sha256, ext):
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}.{ext.lower()}"
+
+def stage_stream(stream, upload_folder, ext):
+    # Hash while copying to a temp file so the bytes are only read once.
+    # Returns (temp_path, sha256, relpath, size); store_staged() then moves the
+    # file to its content address.
+    incoming = os.path.join(upload_folder, INCOMING_DIR)
+    os.makedirs(incoming, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=incoming)
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        discard_staged(tmp_path)
+        raise
+    sha256 = digest.hexdigest()
+    return tmp_path, sha256, blob_path(sha256, ext), size
+
+def store_staged(tmp_path, upload_folder, relpath):
+    # Always replaces the target, even though the bytes are identical: a
+    # cleanup job may be deleting the existing file right now. Identical
+    # uploads still collapse into one file.
+    target = os.path.join(upload_folder, relpath)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(tmp_path, target)
+
+def discard_staged(tmp_path):
+    try:
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        pass
+
+def save_stream(stream, upload_folder, ext):
+    tmp_path, sha256, relpath, size = stage_stream(stream, upload_folder, ext)
+    try:
+        store_staged(tmp_path, upload_folder, relpath)
+    except BaseException:
+        discard_staged(tmp_path)
+        raise
+    return sha256, relpath, size
+
+def stage_upload(file_storage, upload_folder):
+    ext = file_storage.filename.rsplit('.', 1)[1]
+    return stage_stream(file_storage.stream, upload_folder, ext)
+
+def save_file(path, upload_folder, link=False):
+    ext = path.rsplit('.', 1)[1]
+    if link:
+        # Hard-link instead of copying when the source is on the same filesystem.
+        digest = hashlib.sha256()
+        with open(path, 'rb') as source:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        relpath = blob_path(sha256, ext)
+        target = os.path.join(upload_folder, relpath)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(path, target)
+        except FileExistsError:
+            pass
+        except OSError:
+            link = False
+        if link:
+            return sha256, relpath, os.path.getsize(path)
+    with open(path, 'rb') as source:
+        return save_stream(source, upload_folder, ext)
+
+def perceptual_hash(path):
+    # 64-bit difference hash: robust to re-encoding, resizing and small crops.
+    with Image.open(path) as image:
+        image.draft('L', (64, 64))
+        image = image.convert('L').resize((9, 8), Image.LANCZOS)
+        pixels = list(image.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+def phash_bands(value):
+    mask = (1 << PHASH_BAND_BITS) - 1
+    return [(value >> (i * PHASH_BAND_BITS)) & mask for i in range(PHASH_BANDS)]
+
+def to_signed64(value):
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def hamming_distance(a, b):
+    return bin((a ^ b) & ((1 << 64) - 1)).count('1')
+
+def remove_empty_dirs(path, stop):
+    path = os.path.dirname(path)
+    while os.path.abspath(path) != os.path.abspath(stop):
+        try:
+            os.rmdir(path)
+        except OSError:
+            return
+        path = os.path.dirname(path)
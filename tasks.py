@@ -0,0 +1,52 @@
+from flask import current_app
+from models import db, Submission
+from jobs import handler, failure_handler
+from utils import get_coordinates_from_image
+from images import generate_variants
+from storage import perceptual_hash
+import os
+
+@handler('process_submission')
+def process_submission(submission_id):
+    submission = db.session.get(Submission, submission_id)
+    if submission is None:
+        return
+
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    photo_path = os.path.join(upload_folder, submission.photo)
+    coordinates = get_coordinates_from_image(photo_path)
+    if coordinates:
+        submission.set_coordinates(coordinates['latitude'], coordinates['longitude'])
+    # Blobs are immutable, so variants that already exist for these bytes are reused.
+    generate_variants(submission.photo, upload_folder)
+
+    blob = submission.blob
+    if blob is not None:
+        if blob.phash is None:
+            blob.set_phash(perceptual_hash(photo_path))
+        if submission.duplicate_of_id is None:
+            flag_near_duplicate(submission, blob)
+
+    if submission.status == 'pending':
+        submission.status = 'active'
+    db.session.commit()
+
+@failure_handler('process_submission')
+def hold_submission(submission_id):
+    # Out of retries: hold the report for a moderator instead of leaving it
+    # pending, where neither the feed nor the status poller would ever see it.
+    submission = db.session.get(Submission, submission_id)
+    if submission is not None and submission.status == 'pending':
+        submission.status = 'on_hold'
+
+def flag_near_duplicate(submission, blob):
+    similar = blob.find_similar(current_app.config['DUPLICATE_PHASH_DISTANCE'])
+    if not similar:
+        return
+    duplicate = Submission.query.filter(
+        Submission.blob_id.in_([b.id for b in similar]),
+        Submission.id != submission.id
+    ).order_by(Submission.id.desc()).first()
+    if duplicate:
+        submission.duplicate_of_id = duplicate.id
+        current_app.logger.info(f"Submission {submission.id} looks like a duplicate of submission {duplicate.id}")
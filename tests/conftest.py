@@ -0,0 +1,44 @@
+import os
+import tempfile
+import pytest
+
+# main configures itself from the environment at import time.
+_db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ['JOB_WORKERS'] = '0'
+os.environ.setdefault('SECRET_KEY', 'test')
+
+@pytest.fixture(scope='session')
+def app():
+    from flask_migrate import upgrade
+    from main import app
+    app.config['TESTING'] = True
+    app.config['UPLOAD_FOLDER'] = os.path.join(_db_dir, 'uploads')
+    with app.app_context():
+        upgrade()
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def moderator(app, client):
+    from models import db, Admin
+    with app.app_context():
+        if Admin.query.filter_by(username='moderator').first() is None:
+            admin = Admin(username='moderator')
+            admin.set_password('secret')
+            db.session.add(admin)
+            db.session.commit()
+    client.post('/login', data={'username': 'moderator', 'password': 'secret'})
+    return client
+
+@pytest.fixture
+def submission(app):
+    from models import db, Submission
+    with app.app_context():
+        submission = Submission(location='Colfax and Broadway', photo='test.jpg', status='active')
+        db.session.add(submission)
+        db.session.commit()
+        return submission.id
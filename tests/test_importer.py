@@ -0,0 +1,8 @@
+from datetime import datetime
+from importer import parse_created_at
+
+def test_parse_created_at_converts_offsets_to_utc():
+    expected = datetime(2024, 6, 1, 16, 0)
+    assert parse_created_at('2024-06-01T10:00:00-06:00') == expected
+    assert parse_created_at('2024-06-01T16:00:00Z') == expected
+    assert parse_created_at('2024-06-01T16:00:00') == expected
@@ -0,0 +1,13 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+from models import db
+
+def test_failed_statements_leave_no_state_on_the_connection(app):
+    with app.app_context():
+        connection = db.session.connection()
+        with pytest.raises(OperationalError):
+            connection.exec_driver_sql('SELECT * FROM no_such_table')
+        db.session.rollback()
+        connection = db.session.connection()
+        connection.exec_driver_sql('SELECT 1')
+        assert '_query_started' not in connection.info
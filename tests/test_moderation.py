@@ -0,0 +1,79 @@
+import io
+import os
+from PIL import Image
+from models import db, Submission, Blob
+from jobs import run_pending
+import moderation
+
+def jpeg_bytes(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+def upload(client, data):
+    response = client.post('/submit_report', headers={'Accept': 'application/json'},
+                           data={'location': 'Speer and 6th', 'photo': (io.BytesIO(data), 'pothole.jpg')})
+    assert response.status_code == 202
+    return response.get_json()['submission_id']
+
+def photo_path(app, submission_id):
+    with app.app_context():
+        return os.path.join(app.config['UPLOAD_FOLDER'], db.session.get(Submission, submission_id).photo)
+
+def test_deleted_submission_files_are_removed(app, client):
+    submission_id = upload(client, jpeg_bytes('red'))
+    path = photo_path(app, submission_id)
+    with app.app_context():
+        run_pending()
+        moderation.delete(moderation.selection(ids=[submission_id]))
+        db.session.commit()
+        run_pending()
+    assert not os.path.exists(path)
+
+def test_reupload_before_cleanup_keeps_the_file(app, client):
+    data = jpeg_bytes('blue')
+    first = upload(client, data)
+    path = photo_path(app, first)
+    with app.app_context():
+        run_pending()
+        moderation.delete(moderation.selection(ids=[first]))
+        db.session.commit()
+    # Same bytes arrive while the cleanup job is still queued.
+    second = upload(client, data)
+    with app.app_context():
+        run_pending()
+        assert db.session.get(Submission, second).blob is not None
+    assert os.path.exists(path)
+    assert photo_path(app, second) == path
+
+def test_upload_racing_cleanup_keeps_the_file(app, client, monkeypatch):
+    data = jpeg_bytes('green')
+    first = upload(client, data)
+    path = photo_path(app, first)
+    with app.app_context():
+        run_pending()
+        moderation.delete(moderation.selection(ids=[first]))
+        db.session.commit()
+
+    claim = Blob.claim.__func__
+    def claim_after_cleanup(cls, *args):
+        # The cleanup job runs after the upload was hashed but before it is stored.
+        run_pending()
+        return claim(cls, *args)
+    monkeypatch.setattr(Blob, 'claim', classmethod(claim_after_cleanup))
+    second = upload(client, data)
+    assert photo_path(app, second) == path
+    assert os.path.exists(path)
+
+def test_filter_delete_without_a_filter_is_refused(app, moderator, submission):
+    response = moderator.post('/moderator/bulk', data={'action': 'delete', 'scope': 'filter', 'status': 'all'})
+    assert response.status_code == 302
+    with app.app_context():
+        assert db.session.get(Submission, submission) is not None
+
+    response = moderator.post('/moderator/bulk', json={'action': 'delete', 'filter': {}})
+    assert response.status_code == 400
+
+def test_filter_delete_confirmation_names_the_scope(moderator):
+    response = moderator.get('/moderator', query_string={'status': 'on_hold'})
+    assert b'Delete EVERY On Hold submission' in response.data
@@ -0,0 +1,34 @@
+import base64
+import json
+import pytest
+from pagination import decode_cursor, encode_cursor
+
+def make_cursor(keys, sort_key='feed', direction='next'):
+    payload = json.dumps({'s': sort_key, 'd': direction, 'k': keys})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+BAD_CURSORS = [
+    'not-a-cursor',
+    make_cursor([['v', 1]]),
+    make_cursor([['v', [1, 2]], ['v', {}]]),
+    make_cursor([['v', None], ['v', 1]]),
+    make_cursor([['dt', 5], ['v', 1]]),
+    make_cursor({'v': 1}),
+    make_cursor([['v', 1], ['v', 2]], sort_key='moderator'),
+]
+
+@pytest.mark.parametrize('cursor', BAD_CURSORS)
+def test_decode_cursor_rejects_malformed_cursors(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 'feed', 2)
+
+def test_decode_cursor_round_trip():
+    cursor = encode_cursor('feed', 'prev', ['2024-06-01', 7])
+    assert decode_cursor(cursor, 'feed', 2) == ('prev', ['2024-06-01', 7])
+
+@pytest.mark.parametrize('cursor', BAD_CURSORS)
+@pytest.mark.parametrize('path', ['/', '/api/v1/submissions'])
+def test_bad_cursor_falls_back_to_first_page(client, submission, path, cursor):
+    response = client.get(path, query_string={'cursor': cursor})
+    assert response.status_code == 200
+    assert response.data == client.get(path).data
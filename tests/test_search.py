@@ -0,0 +1,8 @@
+def test_comment_posted_from_form_is_searchable(moderator, submission):
+    response = moderator.post('/comment', data={'submission_id': str(submission), 'content': 'Pothole swallowed a hubcap'})
+    assert response.status_code == 200
+
+    response = moderator.get('/moderator/search', query_string={'q': 'hubcap'})
+    assert response.status_code == 200
+    assert b'No submissions or comments match' not in response.data
+    assert b'hubcap' in response.data
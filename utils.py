@@ -1,6 +1,13 @@
+import logging
 import os
+import struct
 from PIL import Image
-from PIL.ExifTags import TAGS, GPSTAGS
+from PIL.ExifTags import GPSTAGS
+from exif import read_gps, ExifError, GPS_IFD_POINTER
+
+logger = logging.getLogger(__name__)
+
+GPSTAGS_BY_NAME = {name: tag for tag, name in GPSTAGS.items()}
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
@@ -9,40 +16,43 @@ def allowed_file(filename):
 
 def get_coordinates_from_image(image_path):
     try:
-        image = Image.open(image_path)
-        exif = image._getexif()
-        
-        if not exif:
-            return None
-        
-        gps_info = {}
-        for tag_id, value in exif.items():
-            tag = TAGS.get(tag_id, tag_id)
-            if tag == "GPSInfo":
-                for key in value:
-                    sub_tag = GPSTAGS.get(key, key)
-                    gps_info[sub_tag] = value[key]
+        return read_gps(image_path)
+    except (ExifError, OSError, struct.error) as e:
+        logger.debug(f"Header-only EXIF parse failed for {image_path}, falling back to Pillow: {str(e)}")
+    return get_coordinates_with_pillow(image_path)
+
+def get_coordinates_with_pillow(image_path):
+    try:
+        with Image.open(image_path) as image:
+            gps_info = image.getexif().get_ifd(GPS_IFD_POINTER)
         
         if not gps_info:
             return None
         
-        lat = gps_info.get('GPSLatitude')
-        lat_ref = gps_info.get('GPSLatitudeRef')
-        lon = gps_info.get('GPSLongitude')
-        lon_ref = gps_info.get('GPSLongitudeRef')
+        lat = gps_info.get(GPSTAGS_BY_NAME['GPSLatitude'])
+        lat_ref = gps_info.get(GPSTAGS_BY_NAME['GPSLatitudeRef'])
+        lon = gps_info.get(GPSTAGS_BY_NAME['GPSLongitude'])
+        lon_ref = gps_info.get(GPSTAGS_BY_NAME['GPSLongitudeRef'])
         
         if not all([lat, lat_ref, lon, lon_ref]):
             return None
         
-        lat = sum([float(x)/float(y) for x, y in lat])
+        degrees, minutes, seconds = (float(x) for x in lat)
+        lat = degrees + minutes / 60 + seconds / 3600
         if lat_ref != 'N':
             lat = -lat
         
-        lon = sum([float(x)/float(y) for x, y in lon])
+        degrees, minutes, seconds = (float(x) for x in lon)
+        lon = degrees + minutes / 60 + seconds / 3600
         if lon_ref != 'E':
             lon = -lon
         
         return {'latitude': lat, 'longitude': lon}
     except Exception as e:
-        print(f"Error extracting GPS data: {str(e)}")
+        logger.warning(f"Error extracting GPS data from {image_path}: {str(e)}")
         return None
+
+def extract_coordinates(args):
+    # Process-pool entry point for bulk re-extraction.
+    photo, path = args
+    return photo, get_coordinates_from_image(path)
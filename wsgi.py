@@ -0,0 +1,4 @@
+# Entry point for WSGI servers, e.g. `gunicorn -w 4 --max-requests 10000 wsgi:app`;
+# `flask serve` runs the built-in pre-forking server instead. Either way, run
+# `flask init-db` first: the serving processes never create or migrate tables.
+from main import app